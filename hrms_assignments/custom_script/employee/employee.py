@@ -4,23 +4,91 @@ from frappe.utils import getdate, add_months, formatdate, add_days, nowdate, cin
 from frappe.utils.file_manager import save_file
 from frappe.utils.pdf import get_pdf
 
+from hrms_assignments.utilities.cache import SiteCache
+from hrms_assignments.utilities.processing_ledger import is_completed, record
+
 KEYWORDS = ("end", "probation", "early")
 BYPASSERS = "Bypasser"
 EXEMPTED_GRADES = ["B1"]
 RESUME_MARKER = "Auto-generated Experience Letter PDF"
+EXPERIENCE_LETTER_QUEUE = "long"
+LEDGER_JOB_EXPERIENCE_LETTER = "experience_letter"
+
+_letterhead_cache = SiteCache(
+    "experience_letter_letterhead", maxsize=64, shared=True, expires_in_sec=24 * 60 * 60
+)
 
 
 def _already_attached(employee_name=None):
-    return bool(
-        frappe.get_all(
-            "File",
-            filters={
-                "attached_to_doctype": "Employee",
-                "attached_to_name": employee_name,
-                "file_name": ("like", f"Experience_Letter_{employee_name}%"),
-            },
-            limit=1,
-        )
+    return is_completed(LEDGER_JOB_EXPERIENCE_LETTER, "Employee", employee_name)
+
+
+def _resolve_letterhead(company=None):
+    lh_name = None
+    if company:
+        lh_name = frappe.db.get_value("Company", company, "default_letter_head")
+    if not lh_name:
+        lh_name = frappe.db.get_value("Letter Head", {"is_default": 1}, "name")
+    if not lh_name:
+        lh_row = frappe.get_all("Letter Head", fields=["name"], limit=1)
+        lh_name = lh_row[0]["name"] if lh_row else None
+    html = ""
+    if lh_name:
+        html = frappe.db.get_value("Letter Head", lh_name, "content") or ""
+    return {"name": lh_name, "html": html}
+
+
+def get_letterhead(company=None):
+    """
+    Letter head used for a company's experience letters: the company default, else
+    the site default, else any Letter Head. Cached per company until a Letter Head
+    or Company changes.
+    """
+    return _letterhead_cache.get(company or "", lambda: _resolve_letterhead(company))
+
+
+def clear_letterhead_cache(doc=None, method=None):
+    _letterhead_cache.invalidate()
+
+
+def _apply_letterhead(html, letterhead_html):
+    if "{{ letterhead" in html:
+        return html.replace(
+            "{% if not no_letterhead %}{{ letterhead }}{% endif %}", letterhead_html
+        ).replace("{{ letterhead }}", letterhead_html)
+    if letterhead_html:
+        return f"{letterhead_html}{html}"
+    return html
+
+
+def render_experience_letter(emp):
+    """Experience letter HTML for an Employee doc, letter head included."""
+    html = frappe.get_print(
+        doctype="Employee",
+        name=emp.name,
+        print_format="Experience Letter",
+        doc=emp,
+        no_letterhead=0,
+    )
+    return _apply_letterhead(html, get_letterhead(emp.company)["html"])
+
+
+def enqueue_experience_letter(employee_name=None, letter_date=None):
+    """
+    Queue experience letter generation for an employee. At most one job per employee
+    is pending at a time; the queue can be moved to a dedicated, throttled worker via
+    the `experience_letter_queue` site config.
+    """
+    if not employee_name:
+        return
+    frappe.enqueue(
+        "hrms_assignments.custom_script.employee.employee.generate_and_attach_experience_letter",
+        queue=frappe.conf.get("experience_letter_queue") or EXPERIENCE_LETTER_QUEUE,
+        job_id=f"experience_letter::{employee_name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        employee_name=employee_name,
+        letter_date=str(getdate(letter_date or nowdate())),
     )
 
 
@@ -41,38 +109,11 @@ def generate_and_attach_experience_letter(employee_name=None, letter_date=None):
         emp.relieving_date = getdate(letter_date or nowdate())
 
     try:
-        html = frappe.get_print(
-            doctype="Employee",
-            name=emp.name,
-            print_format="Experience Letter",
-            doc=emp,
-            no_letterhead=0,
-        )
-
-        letterhead_html = ""
-        lh_name = None
-        if emp.company:
-            lh_name = frappe.db.get_value("Company", emp.company, "default_letter_head")
-        if not lh_name:
-            lh_name = frappe.db.get_value("Letter Head", {"is_default": 1}, "name")
-        if not lh_name:
-            lh_row = frappe.get_all("Letter Head", fields=["name"], limit=1)
-            lh_name = lh_row[0]["name"] if lh_row else None
-        if lh_name:
-            letterhead_html = (
-                frappe.db.get_value("Letter Head", lh_name, "content") or ""
-            )
-
-        if "{{ letterhead" in html:
-            html = html.replace(
-                "{% if not no_letterhead %}{{ letterhead }}{% endif %}", letterhead_html
-            ).replace("{{ letterhead }}", letterhead_html)
-        elif letterhead_html:
-            html = f"{letterhead_html}{html}"
-
+        html = render_experience_letter(emp)
         pdf_bytes = get_pdf(html)
         fname = f"Experience_Letter_{employee_name}.pdf"
         file_doc = save_file(fname, pdf_bytes, "Employee", emp.name, is_private=1)
+        record(LEDGER_JOB_EXPERIENCE_LETTER, "Employee", emp.name)
 
         frappe.get_doc(
             {
@@ -252,8 +293,9 @@ def calculate_probation_end_date(employee=None):
 
 
 def validate_probation_guards(doc, method=None):
-    if doc.status == "Left":
-        generate_and_attach_experience_letter(
+    before_saving = doc.get_doc_before_save()
+    if doc.status == "Left" and (not before_saving or before_saving.status != "Left"):
+        enqueue_experience_letter(
             employee_name=doc.name, letter_date=frappe.utils.today()
         )
 
@@ -266,7 +308,6 @@ def validate_probation_guards(doc, method=None):
     today = getdate(nowdate())
     probation_not_ended = today < end_date
 
-    before_saving = doc.get_doc_before_save()
     previous_state = before_saving.custom_employment_status if before_saving else None
     new_state = doc.get("custom_employment_status")
     stage_changed_to_confirmed = (
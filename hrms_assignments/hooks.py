@@ -149,10 +149,61 @@ doc_events = {
     "Employee": {
         "before_insert": "hrms_assignments.custom_script.employee.employee.before_insert",
         "validate": "hrms_assignments.custom_script.employee.employee.validate_probation_guards",
+        "on_update": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_ctc_source_change",
+        "after_insert": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_ctc_source_change",
+        "on_trash": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_ctc_source_change",
     },
     "Employee Separation": {
         "on_submit": "hrms_assignments.custom_script.employee_separation.employee_separation.before_submit"
     },
+    "Income Tax Slab": {
+        "on_update": "hrms_assignments.utilities.tax_slabs.clear_slab_cache",
+        "on_submit": "hrms_assignments.utilities.tax_slabs.clear_slab_cache",
+        "on_cancel": "hrms_assignments.utilities.tax_slabs.clear_slab_cache",
+        "on_update_after_submit": "hrms_assignments.utilities.tax_slabs.clear_slab_cache",
+        "on_trash": "hrms_assignments.utilities.tax_slabs.clear_slab_cache",
+    },
+    "Employee Tax Exemption Proof Submission": {
+        "on_submit": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_exemption_change",
+        "on_cancel": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_exemption_change",
+        "on_update_after_submit": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_exemption_change",
+    },
+    "Employee Tax Exemption Declaration": {
+        "on_submit": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_exemption_change",
+        "on_cancel": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_exemption_change",
+        "on_update_after_submit": "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.on_exemption_change",
+    },
+    "Employee Tax Exemption Category": {
+        "on_update": "hrms_assignments.utilities.exemption_catalogue.clear_exemption_catalogue",
+        "on_trash": "hrms_assignments.utilities.exemption_catalogue.clear_exemption_catalogue",
+    },
+    "Employee Tax Exemption Sub Category": {
+        "on_update": "hrms_assignments.utilities.exemption_catalogue.clear_exemption_catalogue",
+        "on_trash": "hrms_assignments.utilities.exemption_catalogue.clear_exemption_catalogue",
+    },
+    "Payroll Period": {
+        "on_update": "hrms_assignments.utilities.payroll_periods.clear_payroll_period_index",
+        "on_trash": "hrms_assignments.utilities.payroll_periods.clear_payroll_period_index",
+    },
+    "Letter Head": {
+        "on_update": "hrms_assignments.custom_script.employee.employee.clear_letterhead_cache",
+        "on_trash": "hrms_assignments.custom_script.employee.employee.clear_letterhead_cache",
+    },
+    "Company": {
+        "on_update": "hrms_assignments.custom_script.employee.employee.clear_letterhead_cache",
+        "on_trash": "hrms_assignments.custom_script.employee.employee.clear_letterhead_cache",
+    },
+    "Custom Field": {
+        "on_update": "hrms_assignments.utilities.meta.clear_fieldname_index",
+        "on_trash": "hrms_assignments.utilities.meta.clear_fieldname_index",
+    },
+    "Property Setter": {
+        "on_update": "hrms_assignments.utilities.meta.clear_fieldname_index",
+        "on_trash": "hrms_assignments.utilities.meta.clear_fieldname_index",
+    },
+    "DocType": {
+        "on_update": "hrms_assignments.utilities.meta.clear_fieldname_index",
+    },
 }
 
 # Scheduled Tasks
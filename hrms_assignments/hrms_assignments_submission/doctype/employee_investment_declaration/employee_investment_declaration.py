@@ -1,14 +1,36 @@
 import frappe
 from frappe.model.document import Document
-from frappe.utils import now_datetime
+from frappe.utils import create_batch, now_datetime
 from typing import Dict, Tuple, List
 
+from hrms_assignments.utilities.deduction_caps import (
+    check_80d_limits,
+    compute_totals,
+    rows_80c,
+    rows_80d,
+    total_80c,
+)
+from hrms_assignments.utilities.investment_rules import (
+    CAP_80C_DEFAULT,
+    PREVENTIVE_CAP_DEFAULT,
+    SELF_FAMILY_SET,
+    get_80c_cap,
+    get_80d_caps,
+)
+
+
+BULK_LOCK_BATCH_SIZE = 50
+
+
+def _idx(row):
+    return row.idx or 0
+
 
 class EmployeeInvestmentDeclaration(Document):
-    CAP_80C_DEFAULT = 150000.0
-    PREVENTIVE_CAP_DEFAULT = 5000.0
+    CAP_80C_DEFAULT = CAP_80C_DEFAULT
+    PREVENTIVE_CAP_DEFAULT = PREVENTIVE_CAP_DEFAULT
 
-    SELF_FAMILY_SET = {"Self", "Spouse", "Children"}
+    SELF_FAMILY_SET = SELF_FAMILY_SET
 
     NONCASH_TOKENS = {"non-cash", "cashless", "card", "upi"}
 
@@ -16,31 +38,32 @@ class EmployeeInvestmentDeclaration(Document):
         self.name = f"{self.employee}-{self.fiscal_year}"
 
     def _has_declared_80c(self):
-        return bool(
-            frappe.db.exists(
-                "Employee Investment Line",
-                {
-                    "parent": self.name,
-                    "parenttype": self.doctype,
-                    "section_code": "80C",
-                    "amount_declared": [">", 0],
-                },
-            )
+        inv80c, _ = self.child_rows()
+        return any(
+            (r.get("section_code") or "") == "80C"
+            and float(r.get("amount_declared") or 0) > 0
+            for r in inv80c
         )
 
     def _has_declared_80d(self):
-        return bool(
-            frappe.db.exists(
-                "Medical Insurance Line",
-                {
-                    "parent": self.name,
-                    "parenttype": self.doctype,
-                    "amount_declared": [">", 0],
-                },
+        _, med80d = self.child_rows()
+        return any(float(r.get("amount_declared") or 0) > 0 for r in med80d)
+
+    def child_rows(self) -> Tuple[List[Dict], List[Dict]]:
+        """
+        (investment lines, medical insurance lines) for this document, taken from the
+        in-memory child tables and built once per validate.
+        """
+        if getattr(self, "_child_rows", None) is None:
+            self._child_rows = (
+                [r.as_dict() for r in sorted(self.get("investments"), key=_idx)],
+                [r.as_dict() for r in sorted(self.get("medical_insurance"), key=_idx)],
             )
-        )
+        return self._child_rows
 
     def validate(self):
+        self._child_rows = None
+
         if self._is_locked() and not frappe.has_permission(
             doctype=self.doctype, ptype="submit"
         ):
@@ -87,177 +110,54 @@ class EmployeeInvestmentDeclaration(Document):
             if not getattr(self, "locked_on", None):
                 self.locked_on = now_datetime()
             if "old" in (self.tax_regime or "").strip().lower():
-                sync_to_eted_from_custom(doc=self)
+                eted = sync_to_eted_from_custom(
+                    doc=self, context=self.flags.eted_sync_context
+                )
+                self.flags.eted_name = eted.name
 
     def _compute_totals_for_doc(self) -> Tuple[float, float, Dict[str, float]]:
         inv80c, med80d = self._fetch_children()
-
-        cap_80c = self._resolve_80c_cap()
-        decl_80c = sum(
-            float(r.get("amount_declared") or 0)
-            for r in inv80c
-            if (r.get("section_code") or "").strip() == "80C"
-        )
-        verf_80c = sum(
-            float(r.get("amount_verified") or 0)
-            for r in inv80c
-            if (r.get("section_code") or "").strip() == "80C"
-        )
-        decl_80c_capped = min(decl_80c, cap_80c)
-        verf_80c_capped = min(verf_80c, cap_80c)
-
-        caps = self._resolve_80d_caps()
-
-        def bucket_key(insured_for: str) -> str:
-            return (
-                "SelfFamily"
-                if (insured_for or "").strip() in self.SELF_FAMILY_SET
-                else "Parents"
-            )
-
-        def gather(use_verified: bool):
-            sums = {
-                ("SelfFamily", 0): {"total": 0.0, "preventive": 0.0},
-                ("SelfFamily", 1): {"total": 0.0, "preventive": 0.0},
-                ("Parents", 0): {"total": 0.0, "preventive": 0.0},
-                ("Parents", 1): {"total": 0.0, "preventive": 0.0},
-            }
-            for r in med80d:
-                grp = bucket_key(r.get("insured_for"))
-                senior = 1 if int(r.get("is_a_senior_citizen") or 0) else 0
-                amt = float(
-                    (
-                        r.get("amount_verified")
-                        if use_verified
-                        else r.get("amount_declared")
-                    )
-                    or 0
-                )
-                sums[(grp, senior)]["total"] += amt
-                if int(r.get("preventive_health_checkup") or 0) == 1:
-                    sums[(grp, senior)]["preventive"] += amt
-            return sums
-
-        def apply_caps(sums: Dict[Tuple[str, int], Dict[str, float]]) -> float:
-            total = 0.0
-            for key, agg in sums.items():
-                c = caps.get(key) or caps.get((key[0], 0))
-                if not c:
-                    continue
-                prev_allow = min(
-                    max(agg["preventive"], 0.0), float(c["preventive_cap"])
-                )
-                overflow_prev = max(agg["preventive"] - prev_allow, 0.0)
-                normal_amt = max(agg["total"] - agg["preventive"], 0.0) + overflow_prev
-                total += min(prev_allow + normal_amt, float(c["cap"]))
-            return total
-
-        decl_80d_capped = apply_caps(gather(use_verified=False))
-        verf_80d_capped = apply_caps(gather(use_verified=True))
-
-        sectionwise = {
-            "80C_declared": decl_80c_capped,
-            "80C_verified": verf_80c_capped,
-            "80D_declared": decl_80d_capped,
-            "80D_verified": verf_80d_capped,
-        }
-        return (
-            decl_80c_capped + decl_80d_capped,
-            verf_80c_capped + verf_80d_capped,
-            sectionwise,
+        return compute_totals(
+            inv80c, med80d, self._resolve_80c_cap(), self._resolve_80d_caps()
         )
 
     def _enforce_manual_caps(self):
         errors = []
-        invc80 = frappe.get_all(
-            "Employee Investment Line",
-            filters={
-                "parent": self.name,
-                "parenttype": self.doctype,
-                "section_code": "80C",
-            },
-            fields=["subcategory", "amount_verified"],
-        )
-        v80c = sum(float(r.get("amount_verified") or 0) for r in invc80)
+        inv80c, med = self.child_rows()
+        cap_80c = self._resolve_80c_cap()
+        v80c = total_80c(rows_80c(inv80c, "amount_verified"))
 
-        if v80c > 150000.0 + 0.001:
+        if v80c > cap_80c + 0.001:
             errors.append(
-                f"80C verified total ₹{v80c:,.2f} exceeds the cap ₹1,50,000. "
-                f"Please reduce one or more 80C lines so sum ≤ 1,50,000."
+                f"80C verified total ₹{v80c:,.2f} exceeds the cap ₹{cap_80c:,.0f}. "
+                f"Please reduce one or more 80C lines so sum ≤ {cap_80c:,.0f}."
             )
 
-        med = frappe.get_all(
-            "Medical Insurance Line",
-            filters={"parent": self.name, "parenttype": self.doctype},
-            fields=[
-                "insured_for",
-                "is_a_senior_citizen",
-                "amount_verified",
-                "preventive_health_checkup",
-            ],
+        violations = check_80d_limits(
+            rows_80d(med, "amount_verified"), self._resolve_80d_caps()
         )
-
-        agg = {
-            ("SF", 0): {"prem": 0.0, "prev": 0.0, "cap": 25000.0, "prev_cap": 5000.0},
-            ("SF", 1): {"prem": 0.0, "prev": 0.0, "cap": 50000.0, "prev_cap": 5000.0},
-            ("Parents", 0): {
-                "prem": 0.0,
-                "prev": 0.0,
-                "cap": 25000.0,
-                "prev_cap": 5000.0,
-            },
-            ("Parents", 1): {
-                "prem": 0.0,
-                "prev": 0.0,
-                "cap": 50000.0,
-                "prev_cap": 5000.0,
-            },
-        }
-
-        for r in med:
-            insured_for = r.get("insured_for")
-            g = (
-                "SF"
-                if (insured_for or "").strip() in {"Self", "Spouse", "Children"}
-                else "Parents"
-            )
-            s = 1 if int(r.get("is_a_senior_citizen") or 0) else 0
-            amt = float(r.get("amount_verified") or 0)
-            is_prev = int(r.get("preventive_health_checkup") or 0) == 1
-            if is_prev:
-                agg[(g, s)]["prev"] += amt
-            else:
-                agg[(g, s)]["prem"] += amt
-
-        for (g, s), v in agg.items():
-            if v["prev"] > v["prev_cap"] + 0.001:
-                bucket = "Self/Family" if g == "SF" else "Parents"
-                senior = " (Senior)" if s == 1 else ""
+        for (g, s), kind, amount, limit in violations:
+            bucket = "Self/Family" if g == "SelfFamily" else "Parents"
+            senior = " (Senior)" if s == 1 else ""
+            if kind == "preventive":
                 errors.append(
-                    f"80D {bucket}{senior}: Preventive verified ₹{v['prev']:,.2f} exceeds ₹{v['prev_cap']:,.0f}."
+                    f"80D {bucket}{senior}: Preventive verified ₹{amount:,.2f} exceeds ₹{limit:,.0f}."
                 )
-
-            total = v["prev"] + v["prem"]
-            if total > v["cap"] + 0.001:
-                bucket = "Self/Family" if g == "SF" else "Parents"
-                senior = " (Senior)" if s == 1 else ""
+            else:
                 errors.append(
-                    f"80D {bucket}{senior}: Total verified ₹{total:,.2f} exceeds cap ₹{v['cap']:,.0f}."
+                    f"80D {bucket}{senior}: Total verified ₹{amount:,.2f} exceeds cap ₹{limit:,.0f}."
                 )
 
         if errors:
             frappe.throw("<br>".join(errors))
 
     def _ensure_only_80c_in_investment_lines(self):
-        bad = frappe.get_all(
-            "Employee Investment Line",
-            filters={
-                "parent": self.name,
-                "parenttype": self.doctype,
-                "section_code": ["not in", ["", "80C"]],
-            },
-            pluck="name",
-        )
+        inv80c, _ = self.child_rows()
+        bad = [
+            f"#{r.get('idx')}"
+            for r in inv80c
+            if (r.get("section_code") or "") not in ("", "80C")
+        ]
         if bad:
             frappe.throw(
                 f"Only section_code = 80C is allowed in Employee Investment Line. Invalid rows: {', '.join(bad)}"
@@ -268,11 +168,7 @@ class EmployeeInvestmentDeclaration(Document):
         Preventive checkup can be Cash; premiums should be non-cash (cashless/card/upi).
         We warn (msgprint) rather than throw; switch to throw if you want strict enforcement.
         """
-        rows = frappe.get_all(
-            "Medical Insurance Line",
-            filters={"parent": self.name, "parenttype": self.doctype},
-            fields=["name", "payment_mode", "preventive_health_checkup"],
-        )
+        _, rows = self.child_rows()
         for r in rows:
             mode_raw = (r.get("payment_mode") or "").strip()
             mode = mode_raw.lower()
@@ -280,113 +176,20 @@ class EmployeeInvestmentDeclaration(Document):
             is_noncash = (mode in self.NONCASH_TOKENS) or ("cash" not in mode)
             if not is_prev and not is_noncash:
                 frappe.throw(
-                    f"Note: 80D premium in row {r['name']} is marked Cash. "
+                    f"Note: 80D premium in row #{r.get('idx')} is marked Cash. "
                     f"Only preventive health checkup is typically allowed in Cash.",
                     alert=True,
                     indicator="orange",
                 )
 
     def _fetch_children(self):
-        inv80c = frappe.get_all(
-            "Employee Investment Line",
-            filters={"parent": self.name, "parenttype": self.doctype},
-            fields=[
-                "name",
-                "section_code",
-                "subcategory",
-                "amount_declared",
-                "amount_verified",
-            ],
-            order_by="idx asc",
-        )
-        med80d = frappe.get_all(
-            "Medical Insurance Line",
-            filters={"parent": self.name, "parenttype": self.doctype},
-            fields=[
-                "name",
-                "insured_for",
-                "is_a_senior_citizen",
-                "payment_mode",
-                "amount_declared",
-                "amount_verified",
-                "preventive_health_checkup",
-            ],
-            order_by="idx asc",
-        )
-        return inv80c, med80d
-
-    def _load_section_rule(self, section: str) -> Dict:
-        row = frappe.get_all(
-            "Investment Section Rule",
-            filters={"section": section, "is_active": 1},
-            fields=["name", "section", "computation_type", "absolute_cap"],
-            order_by="modified desc",
-            limit=1,
-        )
-        return row[0] if row else {}
-
-    def _load_80d_variants(self, parent_rule_name: str) -> List[Dict]:
-        if not parent_rule_name:
-            return []
-        return frappe.get_all(
-            "Investment Rule Variant",
-            filters={"parent": parent_rule_name},
-            fields=[
-                "beneficiary_group",
-                "senior_only",
-                "absolute_cap",
-                "preventive_health_checkup_cap",
-            ],
-            order_by="idx asc, modified desc",
-        )
+        return self.child_rows()
 
     def _resolve_80c_cap(self) -> float:
-        rule = self._load_section_rule("80C")
-        cap = float(rule.get("absolute_cap") or 0)
-        return cap if cap > 0 else self.CAP_80C_DEFAULT
+        return get_80c_cap()
 
     def _resolve_80d_caps(self) -> Dict[Tuple[str, int], Dict[str, float]]:
-        """
-        Build cap map keyed by (bucket, senior_flag) → {cap, preventive_cap}
-        bucket ∈ {"SelfFamily","Parents"}; senior_flag ∈ {0,1}
-        """
-        rule = self._load_section_rule("80D")
-        variants = self._load_80d_variants(rule.get("name"))
-        caps: Dict[Tuple[str, int], Dict[str, float]] = {}
-
-        def map_bucket(beneficiary_group: str) -> str:
-            g = (beneficiary_group or "").strip()
-            if g in self.SELF_FAMILY_SET:
-                return "SelfFamily"
-            if g == "Parents":
-                return "Parents"
-            return "SelfFamily"
-
-        for v in variants:
-            key = (
-                map_bucket(v.get("beneficiary_group") or ""),
-                int(v.get("senior_only") or 0),
-            )
-            cap = float(v.get("absolute_cap") or 0)
-            prev_raw = v.get("preventive_health_checkup_cap")
-            prev_cap = float(prev_raw or self.PREVENTIVE_CAP_DEFAULT)
-            if key not in caps or cap > caps[key]["cap"]:
-                caps[key] = {"cap": cap, "preventive_cap": max(prev_cap, 0.0)}
-
-        if not caps:
-            caps[("SelfFamily", 0)] = {
-                "cap": 25000.0,
-                "preventive_cap": self.PREVENTIVE_CAP_DEFAULT,
-            }
-            caps[("Parents", 0)] = {
-                "cap": 25000.0,
-                "preventive_cap": self.PREVENTIVE_CAP_DEFAULT,
-            }
-            caps[("Parents", 1)] = {
-                "cap": 50000.0,
-                "preventive_cap": self.PREVENTIVE_CAP_DEFAULT,
-            }
-        return caps
+        return get_80d_caps()
 
     def _transition(self, old: str, new: str, from_state: str, to_state: str) -> bool:
         return (old or "").strip() == from_state and (new or "").strip() == to_state
@@ -405,13 +208,189 @@ def get_sectionwise_verified(employee: str, fiscal_year: str) -> Dict[str, float
         {"employee": employee, "fiscal_year": fiscal_year},
         "name",
     )
-    if not name:
-        return {"80C": 0.0, "80D": 0.0, "total": 0.0}
-
-    doc = frappe.get_doc("Employee Investment Declaration", name)
-    total_decl, total_verf, sectionwise = doc._compute_totals_for_doc()
-    return {
-        "80C": float(sectionwise["80C_verified"]),
-        "80D": float(sectionwise["80D_verified"]),
-        "total": float(total_verf),
+    if name:
+        frappe.has_permission(
+            "Employee Investment Declaration", "read", doc=name, throw=True
+        )
+    return _sectionwise_verified(fiscal_year, [employee])[employee]
+
+
+@frappe.whitelist()
+def get_sectionwise_verified_bulk(
+    fiscal_year: str, employees=None, company: str = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Verified, capped 80C/80D totals for many employees in one go, keyed by employee.
+    Pass a list of employees, or a company to cover all of its employees.
+    Restricted to HR roles, since it reads declarations across employees.
+    """
+    frappe.only_for(("HR Manager", "HR User", "System Manager"))
+    if isinstance(employees, str):
+        employees = frappe.parse_json(employees)
+    if not employees:
+        if not company:
+            frappe.throw("Pass either a list of employees or a company.")
+        employees = frappe.get_all("Employee", filters={"company": company}, pluck="name")
+    return _sectionwise_verified(fiscal_year, employees)
+
+
+def _sectionwise_verified(fiscal_year: str, employees) -> Dict[str, Dict[str, float]]:
+    out = {emp: {"80C": 0.0, "80D": 0.0, "total": 0.0} for emp in employees}
+    decl_to_emp = {}
+    for batch in create_batch(employees, 1000):
+        for d in frappe.get_all(
+            "Employee Investment Declaration",
+            filters={"employee": ["in", batch], "fiscal_year": fiscal_year},
+            fields=["name", "employee"],
+        ):
+            decl_to_emp[d.name] = d.employee
+    if not decl_to_emp:
+        return out
+
+    inv_rows = _load_child_rows(
+        "Employee Investment Line",
+        decl_to_emp,
+        ["parent", "section_code", "amount_declared", "amount_verified"],
+    )
+    med_rows = _load_child_rows(
+        "Medical Insurance Line",
+        decl_to_emp,
+        [
+            "parent",
+            "insured_for",
+            "is_a_senior_citizen",
+            "amount_declared",
+            "amount_verified",
+            "preventive_health_checkup",
+        ],
+    )
+
+    cap_80c = get_80c_cap()
+    caps_80d = get_80d_caps()
+    for decl, emp in decl_to_emp.items():
+        _, total_verf, sectionwise = compute_totals(
+            inv_rows.get(decl, []), med_rows.get(decl, []), cap_80c, caps_80d
+        )
+        out[emp] = {
+            "80C": float(sectionwise["80C_verified"]),
+            "80D": float(sectionwise["80D_verified"]),
+            "total": float(total_verf),
+        }
+    return out
+
+
+def _load_child_rows(child_doctype: str, parents, fields: List[str]):
+    rows: Dict[str, List[Dict]] = {}
+    for batch in create_batch(list(parents), 1000):
+        for r in frappe.get_all(
+            child_doctype,
+            filters={
+                "parent": ["in", batch],
+                "parenttype": "Employee Investment Declaration",
+            },
+            fields=fields,
+            order_by="idx asc",
+        ):
+            rows.setdefault(r.parent, []).append(r)
+    return rows
+
+
+@frappe.whitelist()
+def bulk_lock_and_sync(declarations) -> str:
+    """
+    Lock many Verified declarations and sync their ETEDs on the long queue.
+    Returns a job id; per-declaration results are available from get_bulk_lock_result.
+    """
+    frappe.has_permission("Employee Investment Declaration", "submit", throw=True)
+    if isinstance(declarations, str):
+        declarations = frappe.parse_json(declarations)
+    if not declarations:
+        frappe.throw("Select at least one Employee Investment Declaration.")
+
+    job_id = f"bulk_lock_declarations:{frappe.generate_hash(length=10)}"
+    frappe.enqueue(
+        "hrms_assignments.hrms_assignments_submission.doctype.employee_investment_declaration.employee_investment_declaration.run_bulk_lock_and_sync",
+        queue="long",
+        timeout=6 * 60 * 60,
+        job_id=job_id,
+        declarations=list(declarations),
+        result_key=job_id,
+        user=frappe.session.user,
+    )
+    return job_id
+
+
+@frappe.whitelist()
+def get_bulk_lock_result(job_id: str):
+    frappe.has_permission("Employee Investment Declaration", "submit", throw=True)
+    return frappe.cache().get_value(f"hrms_assignments:{job_id}")
+
+
+def run_bulk_lock_and_sync(declarations, result_key=None, user=None):
+    from hrms_assignments.utilities.employee import build_sync_context
+
+    rows = []
+    for batch in create_batch(declarations, 1000):
+        rows += frappe.get_all(
+            "Employee Investment Declaration",
+            filters={"name": ["in", batch]},
+            fields=["name", "employee", "fiscal_year", "declaration_status"],
+        )
+    found = {r.name for r in rows}
+    results = [
+        {"declaration": name, "status": "Failed", "error": "Not found"}
+        for name in declarations
+        if name not in found
+    ]
+
+    context = build_sync_context(rows)
+    for batch in create_batch(rows, BULK_LOCK_BATCH_SIZE):
+        for row in batch:
+            results.append(_lock_and_sync_one(row, context))
+        frappe.db.commit()
+
+    summary = {
+        "total": len(results),
+        "locked": sum(1 for r in results if r["status"] == "Locked"),
+        "skipped": sum(1 for r in results if r["status"] == "Skipped"),
+        "failed": sum(1 for r in results if r["status"] == "Failed"),
     }
+    if result_key:
+        frappe.cache().set_value(
+            f"hrms_assignments:{result_key}",
+            {"summary": summary, "results": results},
+            expires_in_sec=24 * 60 * 60,
+        )
+    frappe.publish_realtime(
+        "bulk_lock_declarations_done",
+        {"job_id": result_key, "summary": summary},
+        user=user,
+    )
+    return results
+
+
+def _lock_and_sync_one(row, context) -> Dict:
+    if (row.declaration_status or "").strip() != "Verified":
+        return {
+            "declaration": row.name,
+            "status": "Skipped",
+            "error": f"Status is {row.declaration_status or 'empty'}, expected Verified",
+        }
+
+    frappe.db.savepoint("bulk_lock_declaration")
+    try:
+        doc = frappe.get_doc("Employee Investment Declaration", row.name)
+        doc.declaration_status = "Locked"
+        doc.flags.eted_sync_context = context
+        doc.save()
+        return {
+            "declaration": row.name,
+            "status": "Locked",
+            "eted": doc.flags.eted_name,
+        }
+    except Exception as e:
+        frappe.db.rollback(save_point="bulk_lock_declaration")
+        frappe.log_error(
+            frappe.get_traceback(), f"Bulk lock failed for declaration {row.name}"
+        )
+        return {"declaration": row.name, "status": "Failed", "error": str(e)}
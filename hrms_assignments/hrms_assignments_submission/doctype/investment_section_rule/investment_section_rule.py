@@ -4,6 +4,12 @@
 # import frappe
 from frappe.model.document import Document
 
+from hrms_assignments.utilities.investment_rules import clear_rule_cache
+
 
 class InvestmentSectionRule(Document):
-	pass
+	def on_update(self):
+		clear_rule_cache()
+
+	def on_trash(self):
+		clear_rule_cache()
@@ -0,0 +1,17 @@
+# Copyright (c) 2026, Sparsh Verma and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class ProcessingLedger(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Processing Ledger",
+		["job", "reference_doctype", "reference_name"],
+		constraint_name="unique_job_reference",
+	)
@@ -53,6 +53,12 @@ frappe.query_reports["Tax Deductions Comparison"] = {
       fieldtype: "Check",
       default: 1,
     },
+    {
+      fieldname: "run_in_background",
+      label: "Run in Background",
+      fieldtype: "Check",
+      default: 0,
+    },
     {
       fieldname: "debug",
       label: "Debug",
@@ -65,6 +71,28 @@ frappe.query_reports["Tax Deductions Comparison"] = {
     report.datatable_options = report.datatable_options || {};
     report.datatable_options.freezeColumns = 3;
 
+    frappe.realtime.off("tax_deductions_comparison_prepared");
+    frappe.realtime.on("tax_deductions_comparison_prepared", () => {
+      frappe.show_alert({
+        message: "Tax Deductions Comparison is ready.",
+        indicator: "green",
+      });
+      report.refresh();
+    });
+
+    report.page.add_inner_button("Export CSV", () => {
+      frappe.call({
+        method:
+          "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.export_csv",
+        args: { filters: report.get_filter_values() },
+        freeze: true,
+        freeze_message: "Preparing CSV...",
+        callback: (r) => {
+          if (r.message) window.open(r.message);
+        },
+      });
+    });
+
     report.page.add_inner_button("Legend", () => {
       frappe.msgprint({
         title: "Legend",
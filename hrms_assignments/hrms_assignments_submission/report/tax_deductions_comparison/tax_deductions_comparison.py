@@ -1,54 +1,274 @@
+import csv
+import hashlib
+
 import frappe
 from frappe.utils import flt, getdate
 
+from hrms_assignments.utilities.meta import get_fieldnames
+from hrms_assignments.utilities.tax_engine import (
+    compute_tax,
+    compute_tax_batch,
+    slab_breakdown,
+)
+from hrms_assignments.utilities.tax_slabs import (
+    fiscal_year_of,
+    get_slab_table,
+    slab_tables_version,
+)
+
+CTC_ANNUAL_FIELDS = (
+    "cost_to_company",
+    "ctc",
+    "annual_ctc",
+    "total_ctc",
+    "ctc_annual",
+    "ctc_yearly",
+    "ctc_year",
+)
+CTC_MONTHLY_FIELDS = ("ctc_monthly", "monthly_ctc", "ctc_per_month")
+
+REPORT_NAME = "Tax Deductions Comparison"
+
+# Upper bound on the size of an ``in`` filter sent in a single query.
+IN_FILTER_CHUNK = 1000
+# Employees processed per page when streaming rows.
+PAGE_SIZE = 500
+# How long a prepared result is kept once computed.
+PREPARED_RESULT_TTL = 24 * 60 * 60
+
 
 def execute(filters=None):
     filters = frappe._dict(filters or {})
     _normalize_filters(filters)
     columns = _get_columns(filters)
-    employees = _get_employees(filters)
-    if not employees:
-        frappe.msgprint("No employees found for the selected filters.")
+
+    # Keyed once, before any rows are built: a data version bump while rows are
+    # being computed must not file them under the new version.
+    key = _prepared_result_key(filters)
+    cached = get_prepared_result(key)
+    if cached is not None:
+        return columns, cached
+
+    if int(filters.get("run_in_background") or 0):
+        enqueue_prepared_result(filters, key)
+        frappe.msgprint(
+            "The report is being prepared in the background. "
+            "It will refresh automatically once ready."
+        )
         return columns, []
 
-    rows = []
-    for emp in employees:
-        base = _compute_base_from_employee_ctc(emp, filters)
-        exemptions_total = _get_exemptions(emp.name, filters)
-
-        regimes = ["Old", "New"] if filters.regime == "Both" else [filters.regime]
-        for regime in regimes:
-            if regime == "Old":
-                calc = _compute_tax_old_custom(
-                    gross_annual=base["gross_annual"],
-                    exemptions_vi_a_annual=exemptions_total,
-                    annualize=bool(int(filters.annualize or 0)),
-                )
-            else:
-                calc = _compute_tax_new_custom(
-                    gross_annual=base["gross_annual"],
-                    annualize=bool(int(filters.annualize or 0)),
-                )
-
-            row = [
+    pages = list(iter_row_pages(filters))
+    _store_prepared_result(key, pages)
+    rows = [row for page in pages for row in page]
+    if not rows:
+        frappe.msgprint("No employees found for the selected filters.")
+    return columns, rows
+
+
+def iter_rows(filters, page_size=PAGE_SIZE):
+    """
+    Yield report rows page by page so memory stays bounded by `page_size` employees.
+    Expects filters already passed through _normalize_filters.
+    """
+    for page in iter_row_pages(filters, page_size):
+        yield from page
+
+
+def iter_row_pages(filters, page_size=PAGE_SIZE):
+    """Yield lists of report rows, one list per page of `page_size` employees."""
+    ctc_fields = _get_ctc_fields()
+    regimes = ["Old", "New"] if filters.regime == "Both" else [filters.regime]
+    tables = {
+        regime: get_slab_table(regime, filters.as_on, filters.company)
+        for regime in regimes
+    }
+    annualize = bool(int(filters.annualize or 0))
+
+    start = 0
+    while True:
+        employees = _get_employees(
+            filters, ctc_fields, start=start, page_length=page_size
+        )
+        if not employees:
+            return
+        yield list(_rows_for_page(employees, filters, ctc_fields, tables, annualize))
+        if len(employees) < page_size:
+            return
+        start += page_size
+
+
+def _rows_for_page(employees, filters, ctc_fields, tables, annualize):
+    exemptions = _load_exemptions([emp.name for emp in employees], filters)
+
+    gross = [
+        _compute_base_from_employee_ctc(emp, ctc_fields)["gross_annual"]
+        for emp in employees
+    ]
+    exempt = [exemptions.get(emp.name, 0.0) for emp in employees]
+
+    results = {
+        regime: compute_tax_batch(table, gross, exempt, annualize=annualize)
+        for regime, table in tables.items()
+    }
+
+    for i, emp in enumerate(employees):
+        for regime, calc in results.items():
+            yield [
                 emp.name,
                 emp.employee_name or "",
                 regime,
-                calc["gross_annual"],
-                calc["std_deduction"],
-                calc["exemptions_total"],
-                calc["taxable_income"],
-                calc["slab_tax"],
-                calc["rebate_applied"],
-                calc["cess_amount"],
-                calc["net_tax"],
-                calc["monthly_tds"],
-                calc["effective_rate_pct"],
+                calc["gross_annual"][i],
+                calc["std_deduction"][i],
+                calc["exemptions_total"][i],
+                calc["taxable_income"][i],
+                calc["slab_tax"][i],
+                calc["rebate_applied"][i],
+                calc["cess_amount"][i],
+                calc["net_tax"][i],
+                calc["monthly_tds"][i],
+                calc["effective_rate_pct"][i],
             ]
 
-            rows.append(row)
 
-    return columns, rows
+def _data_version_key(company):
+    return f"hrms_assignments:tax_comparison:data_version:{company}"
+
+
+def bump_data_version(company):
+    """Invalidate every prepared result for `company`."""
+    if company:
+        frappe.cache().set_value(
+            _data_version_key(company), frappe.generate_hash(length=12)
+        )
+
+
+def _prepared_result_key(filters):
+    parts = (
+        filters.company,
+        filters.get("payroll_period") or "",
+        filters.regime,
+        filters.get("employee") or "",
+        int(filters.annualize or 0),
+        int(filters.use_verified_exemptions_only or 0),
+        fiscal_year_of(filters.as_on),
+        frappe.cache().get_value(_data_version_key(filters.company)) or "",
+        slab_tables_version() or "",
+    )
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f"hrms_assignments:tax_comparison:result:{digest}"
+
+
+def get_prepared_result(key):
+    """Rows stored under `key`, or None when missing or any page has expired."""
+    cache = frappe.cache()
+    page_count = cache.get_value(key)
+    if not isinstance(page_count, int):
+        return None
+    rows = []
+    for i in range(page_count):
+        page = cache.get_value(f"{key}:{i}")
+        if page is None:
+            return None
+        rows.extend(page)
+    return rows
+
+
+def _store_prepared_result(key, pages):
+    """
+    Store `pages` one cache value per page, so a background build holds a single
+    page at a time. The page count is written last; readers never see a partial
+    result.
+    """
+    cache = frappe.cache()
+    page_count = 0
+    for page in pages:
+        cache.set_value(
+            f"{key}:{page_count}", page, expires_in_sec=PREPARED_RESULT_TTL
+        )
+        page_count += 1
+    cache.set_value(key, page_count, expires_in_sec=PREPARED_RESULT_TTL)
+
+
+def enqueue_prepared_result(filters, key):
+    payload = dict(filters, as_on=str(filters.as_on))
+    frappe.enqueue(
+        "hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison.build_prepared_result",
+        queue="long",
+        timeout=3600,
+        job_id=key,
+        deduplicate=True,
+        filters=payload,
+        key=key,
+        user=frappe.session.user,
+    )
+
+
+def build_prepared_result(filters, key=None, user=None):
+    filters = frappe._dict(filters)
+    _normalize_filters(filters)
+    key = key or _prepared_result_key(filters)
+    _store_prepared_result(key, iter_row_pages(filters))
+    frappe.publish_realtime(
+        "tax_deductions_comparison_prepared",
+        {"company": filters.company},
+        user=user,
+    )
+
+
+def on_ctc_source_change(doc, method=None):
+    """Employee hook: drop prepared results when CTC inputs of an employee change."""
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    if before:
+        annual, monthly = _get_ctc_fields()
+        fields = ("company", "employee_name", *annual, *monthly)
+        if all(before.get(f) == doc.get(f) for f in fields):
+            return
+        if before.company != doc.company:
+            bump_data_version(before.company)
+    bump_data_version(doc.company)
+
+
+def on_exemption_change(doc, method=None):
+    """Proof Submission / Declaration hook: drop prepared results for the company."""
+    bump_data_version(doc.get("company"))
+
+
+def write_csv(filters, fileobj):
+    """Stream the report as CSV into `fileobj` one page at a time."""
+    writer = csv.writer(fileobj)
+    writer.writerow([col["label"] for col in _get_columns(filters)])
+    for row in iter_rows(filters):
+        writer.writerow(row)
+
+
+@frappe.whitelist()
+def export_csv(filters=None):
+    if not frappe.get_cached_doc("Report", REPORT_NAME).is_permitted():
+        frappe.throw("Not permitted to export this report.", frappe.PermissionError)
+
+    filters = frappe._dict(frappe.parse_json(filters) or {})
+    _normalize_filters(filters)
+
+    file_name = f"Tax_Deductions_Comparison_{frappe.generate_hash(length=10)}.csv"
+    with open(
+        frappe.get_site_path("private", "files", file_name),
+        "w",
+        newline="",
+        encoding="utf-8",
+    ) as f:
+        write_csv(filters, f)
+
+    file_doc = frappe.get_doc(
+        {
+            "doctype": "File",
+            "file_name": file_name,
+            "file_url": f"/private/files/{file_name}",
+            "is_private": 1,
+            "attached_to_doctype": "Report",
+            "attached_to_name": REPORT_NAME,
+        }
+    ).insert(ignore_permissions=True)
+    return file_doc.file_url
 
 
 def _normalize_filters(filters):
@@ -146,56 +366,53 @@ def _get_columns(filters):
     return cols
 
 
-def _get_employees(filters):
+def _get_employees(filters, ctc_fields=None, start=0, page_length=0):
     cond = {"company": filters.company}
     if filters.get("employee"):
         cond["name"] = filters.employee
+    annual, monthly = ctc_fields or ((), ())
     return frappe.get_all(
         "Employee",
         filters=cond,
-        fields=["name", "employee_name"],
-        order_by="employee_name",
+        fields=["name", "employee_name", *annual, *monthly],
+        order_by="employee_name asc, name asc",
+        start=start,
+        page_length=page_length,
     )
 
 
-def _field_exists(doctype, fieldname):
-    try:
-        meta = frappe.get_meta(doctype)
-        return any(df.fieldname == fieldname for df in meta.fields)
-    except Exception:
-        return False
+def _chunks(values, size=IN_FILTER_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
 
 
-def _extract_ctc_from_employee(emp_name):
-    doc = frappe.get_doc("Employee", emp_name)
+def _get_ctc_fields():
+    """Return the (annual, monthly) CTC columns that exist on Employee, in priority order."""
+    fieldnames = get_fieldnames("Employee")
+    annual = tuple(f for f in CTC_ANNUAL_FIELDS if f in fieldnames)
+    monthly = tuple(f for f in CTC_MONTHLY_FIELDS if f in fieldnames)
+    return annual, monthly
+
+
+def _extract_ctc_from_employee(emp, ctc_fields):
+    annual_fields, monthly_fields = ctc_fields
 
-    annual_fields = [
-        "cost_to_company",
-        "ctc",
-        "annual_ctc",
-        "total_ctc",
-        "ctc_annual",
-        "ctc_yearly",
-        "ctc_year",
-    ]
     for f in annual_fields:
-        if _field_exists("Employee", f):
-            val = flt(getattr(doc, f, 0) or 0)
-            if val > 0:
-                return {"annual": val, "source_field": f}
+        val = flt(emp.get(f) or 0)
+        if val > 0:
+            return {"annual": val, "source_field": f}
 
-    monthly_fields = ["ctc_monthly", "monthly_ctc", "ctc_per_month"]
     for f in monthly_fields:
-        if _field_exists("Employee", f):
-            val = flt(getattr(doc, f, 0) or 0)
-            if val > 0:
-                return {"annual": val * 12.0, "source_field": f}
+        val = flt(emp.get(f) or 0)
+        if val > 0:
+            return {"annual": val * 12.0, "source_field": f}
 
     return {"annual": 0.0, "source_field": None}
 
 
-def _compute_base_from_employee_ctc(emp, filters):
-    ctc = _extract_ctc_from_employee(emp.name)
+def _compute_base_from_employee_ctc(emp, ctc_fields):
+    ctc = _extract_ctc_from_employee(emp, ctc_fields)
     gross_annual = flt(ctc["annual"], 2)
     base = {
         "gross_annual": gross_annual,
@@ -208,179 +425,96 @@ def _compute_base_from_employee_ctc(emp, filters):
     return base
 
 
-def _get_exemptions(employee, filters):
+def _load_exemptions(employees, filters):
+    """
+    Bulk-load exemption totals keyed by employee for the selected payroll period.
+    Approved proofs win; submitted declarations are used only for employees without
+    proofs, and only when unverified exemptions are allowed.
+    """
     payroll_period = filters.get("payroll_period")
-    if not payroll_period:
-        return 0.0
+    if not payroll_period or not employees:
+        return {}
 
-    proofs = frappe.get_all(
+    totals = _sum_child_amounts(
         "Employee Tax Exemption Proof Submission",
-        filters={
-            "employee": employee,
-            "payroll_period": payroll_period,
-            "docstatus": 1,
-        },
-        fields=["name"],
+        "Employee Tax Exemption Proofs",
+        "approved_amount",
+        employees,
+        payroll_period,
     )
-    if proofs:
-        rows = frappe.get_all(
-            "Employee Tax Exemption Proofs",
-            filters={"parent": ["in", [p.name for p in proofs]]},
-            fields=["approved_amount"],
-        )
-        return flt(sum(flt(r.approved_amount) for r in rows), 2)
 
     if not bool(int(filters.use_verified_exemptions_only or 0)):
-        decl = frappe.get_all(
+        pending = [e for e in employees if e not in totals]
+        declared = _sum_child_amounts(
             "Employee Tax Exemption Declaration",
+            "Employee Tax Exemption",
+            "amount",
+            pending,
+            payroll_period,
+        )
+        totals.update(declared)
+
+    return {emp: flt(total, 2) for emp, total in totals.items()}
+
+
+def _sum_child_amounts(
+    parent_doctype, child_doctype, amount_field, employees, payroll_period
+):
+    """Return {employee: total} for employees having at least one submitted parent."""
+    parent_to_employee = {}
+    for chunk in _chunks(employees):
+        for p in frappe.get_all(
+            parent_doctype,
             filters={
-                "employee": employee,
+                "employee": ["in", chunk],
                 "payroll_period": payroll_period,
                 "docstatus": 1,
             },
-            fields=["name"],
-        )
-        if decl:
-            rows = frappe.get_all(
-                "Employee Tax Exemption",
-                filters={"parent": ["in", [d.name for d in decl]]},
-                fields=["amount"],
-            )
-            return flt(sum(flt(r.amount) for r in rows), 2)
+            fields=["name", "employee"],
+        ):
+            parent_to_employee[p.name] = p.employee
 
-    return 0.0
+    totals = {emp: 0.0 for emp in parent_to_employee.values()}
+    for chunk in _chunks(parent_to_employee):
+        for r in frappe.get_all(
+            child_doctype,
+            filters={"parent": ["in", chunk]},
+            fields=["parent", amount_field],
+        ):
+            totals[parent_to_employee[r.parent]] += flt(r.get(amount_field))
+    return totals
 
 
 def _compute_tax_old_custom(
-    gross_annual, exemptions_vi_a_annual, annualize=True, want_breakdown=False
+    gross_annual,
+    exemptions_vi_a_annual,
+    annualize=True,
+    want_breakdown=False,
+    as_on=None,
 ):
-    std_deduction = 50000.0
-    taxable_income = max(
-        0.0, flt(gross_annual) - std_deduction - flt(exemptions_vi_a_annual)
+    return _compute_tax_custom(
+        "Old", gross_annual, exemptions_vi_a_annual, annualize, want_breakdown, as_on
     )
 
-    bands = []
-
-    def _add(from_amt, to_amt, rate_pct):
-        nonlocal bands
-        upper = to_amt if to_amt is not None else 9e18
-        if taxable_income <= from_amt:
-            return 0.0
-        slice_amt = min(taxable_income, upper) - from_amt
-        if slice_amt <= 0:
-            return 0.0
-        tax = slice_amt * (rate_pct / 100.0)
-        if want_breakdown:
-            bands.append(
-                {
-                    "from": flt(from_amt, 2),
-                    "to": (None if to_amt is None else flt(to_amt, 2)),
-                    "slice": flt(slice_amt, 2),
-                    "rate_pct": flt(rate_pct, 2),
-                    "fixed": 0.0,
-                    "tax": flt(tax, 2),
-                }
-            )
-        return tax
-
-    slab_tax = 0.0
-    slab_tax += _add(0, 250000, 0)
-
-    if taxable_income > 500000:
-        slab_tax += _add(250000, 500000, 5)
-    else:
-        pass
-
-    slab_tax += _add(500000, 1000000, 20)
-
-    slab_tax += _add(1000000, None, 30)
-
-    rebate_applied = 0.0
-    if taxable_income <= 500000:
-        rebate_applied = flt(slab_tax, 2)
-        slab_tax = 0.0
-
-    cess_amount = flt(slab_tax * 0.04, 2) if slab_tax > 0 else 0.0
-    net_tax = flt(slab_tax + cess_amount, 2)
-
-    months = 12 if annualize else 1
-    monthly_tds = flt(net_tax / months, 2)
-    effective_rate_pct = (
-        flt((net_tax / gross_annual * 100.0), 2) if gross_annual > 0 else 0.0
-    )
-
-    return {
-        "gross_annual": flt(gross_annual, 2),
-        "std_deduction": flt(std_deduction, 2),
-        "exemptions_total": flt(exemptions_vi_a_annual, 2),
-        "taxable_income": flt(taxable_income, 2),
-        "slab_tax": flt(slab_tax, 2),
-        "rebate_applied": flt(rebate_applied, 2),
-        "cess_amount": flt(cess_amount, 2),
-        "net_tax": flt(net_tax, 2),
-        "monthly_tds": monthly_tds,
-        "effective_rate_pct": effective_rate_pct,
-        "bands": bands if want_breakdown else [],
-    }
 
+def _compute_tax_new_custom(
+    gross_annual, annualize=True, want_breakdown=False, as_on=None
+):
+    return _compute_tax_custom("New", gross_annual, 0.0, annualize, want_breakdown, as_on)
 
-def _compute_tax_new_custom(gross_annual, annualize=True, want_breakdown=False):
-    std_deduction = 60000.0
-    taxable_income = max(0.0, flt(gross_annual) - std_deduction)
-
-    bands = []
-
-    def _add(from_amt, to_amt, rate_pct):
-        nonlocal bands
-        upper = to_amt if to_amt is not None else 9_999_999_99.0
-        if taxable_income <= from_amt:
-            return 0.0
-        slice_amt = min(taxable_income, upper) - from_amt
-        if slice_amt <= 0:
-            return 0.0
-        tax = slice_amt * (rate_pct / 100.0)
-        if want_breakdown:
-            bands.append(
-                {
-                    "from": flt(from_amt, 2),
-                    "to": (None if to_amt is None else flt(to_amt, 2)),
-                    "slice": flt(slice_amt, 2),
-                    "rate_pct": flt(rate_pct, 2),
-                    "fixed": 0.0,
-                    "tax": flt(tax, 2),
-                }
-            )
-        return tax
-
-    slab_tax = 0.0
-    slab_tax += _add(0, 400000, 0)
-    slab_tax += _add(400000, 800000, 5)
-    slab_tax += _add(800000, 1200000, 10)
-    slab_tax += _add(1200000, 1600000, 15)
-    slab_tax += _add(1600000, 2000000, 20)
-    slab_tax += _add(2000000, 2400000, 25)
-    slab_tax += _add(2400000, None, 30)
-    rebate_applied = 0.0
-
-    cess_amount = flt(slab_tax * 0.04, 2) if slab_tax > 0 else 0.0
-    net_tax = flt(slab_tax + cess_amount, 2)
-
-    months = 12 if annualize else 1
-    monthly_tds = flt(net_tax / months, 2)
-    effective_rate_pct = (
-        flt((net_tax / gross_annual * 100.0), 2) if gross_annual > 0 else 0.0
-    )
 
-    return {
-        "gross_annual": flt(gross_annual, 2),
-        "std_deduction": flt(std_deduction, 2),
-        "exemptions_total": 0.0,
-        "taxable_income": flt(taxable_income, 2),
-        "slab_tax": flt(slab_tax, 2),
-        "rebate_applied": flt(rebate_applied, 2),
-        "cess_amount": flt(cess_amount, 2),
-        "net_tax": flt(net_tax, 2),
-        "monthly_tds": monthly_tds,
-        "effective_rate_pct": effective_rate_pct,
-        "bands": bands if want_breakdown else [],
-    }
+def _compute_tax_custom(
+    regime, gross_annual, exemptions, annualize, want_breakdown, as_on=None
+):
+    table = get_slab_table(regime, as_on)
+    calc = compute_tax(table, gross_annual, exemptions, annualize)
+    calc["bands"] = []
+    if want_breakdown:
+        taxable = max(
+            0.0,
+            flt(gross_annual)
+            - table["std_deduction"]
+            - (flt(exemptions) if table["allow_exemptions"] else 0.0),
+        )
+        calc["bands"] = slab_breakdown(table, taxable)
+    return calc
@@ -0,0 +1,116 @@
+# Copyright (c) 2025, Sparsh Verma and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt
+
+from hrms_assignments.hrms_assignments_submission.report.tax_deductions_comparison.tax_deductions_comparison import (
+	_compute_tax_new_custom,
+	_compute_tax_old_custom,
+)
+from hrms_assignments.utilities.tax_engine import (
+	OLD_REGIME,
+	RESULT_KEYS,
+	compile_regime,
+	compute_tax_batch,
+	slab_breakdown,
+	slab_tax_for,
+)
+from hrms_assignments.utilities.tax_slabs import clear_slab_cache, get_slab_table
+
+GROSS = [0, 50000, 300000, 550000, 560000, 749999.99, 1050000, 1800000, 2500000, 6123456.78]
+EXEMPT = [0, 0, 10000, 0, 25000, 150000, 175000, 200000, 0, 125000]
+
+
+def _reference(gross, exempt, std_deduction, slabs, rebate_limit, annualize=True):
+	"""Band-by-band walk as the report computed tax before the batched engine."""
+	taxable = max(0.0, flt(gross) - std_deduction - flt(exempt))
+	slab_tax = 0.0
+	for lo, hi, rate, min_income in slabs:
+		if min_income is not None and taxable <= min_income:
+			continue
+		upper = hi if hi is not None else 9e18
+		if taxable <= lo or min(taxable, upper) - lo <= 0:
+			continue
+		slab_tax += (min(taxable, upper) - lo) * (rate / 100.0)
+	rebate = 0.0
+	if rebate_limit is not None and taxable <= rebate_limit:
+		rebate = flt(slab_tax, 2)
+		slab_tax = 0.0
+	cess = flt(slab_tax * 0.04, 2) if slab_tax > 0 else 0.0
+	net = flt(slab_tax + cess, 2)
+	return {
+		"gross_annual": flt(gross, 2),
+		"std_deduction": flt(std_deduction, 2),
+		"exemptions_total": flt(exempt, 2),
+		"taxable_income": flt(taxable, 2),
+		"slab_tax": flt(slab_tax, 2),
+		"rebate_applied": flt(rebate, 2),
+		"cess_amount": cess,
+		"net_tax": net,
+		"monthly_tds": flt(net / (12 if annualize else 1), 2),
+		"effective_rate_pct": flt(net / gross * 100.0, 2) if gross > 0 else 0.0,
+	}
+
+
+OLD_SLABS = [
+	(0, 250000, 0, None),
+	(250000, 500000, 5, 500000),
+	(500000, 1000000, 20, None),
+	(1000000, None, 30, None),
+]
+NEW_SLABS = [
+	(0, 400000, 0, None),
+	(400000, 800000, 5, None),
+	(800000, 1200000, 10, None),
+	(1200000, 1600000, 15, None),
+	(1600000, 2000000, 20, None),
+	(2000000, 2400000, 25, None),
+	(2400000, None, 30, None),
+]
+
+
+class TestTaxDeductionsComparison(FrappeTestCase):
+	def test_batch_matches_reference_old_regime(self):
+		for annualize in (True, False):
+			batch = compute_tax_batch("Old", GROSS, EXEMPT, annualize=annualize)
+			for i, (gross, exempt) in enumerate(zip(GROSS, EXEMPT)):
+				expected = _reference(gross, exempt, 50000.0, OLD_SLABS, 500000.0, annualize)
+				for key in RESULT_KEYS:
+					self.assertEqual(batch[key][i], expected[key], (gross, key))
+
+	def test_batch_matches_reference_new_regime(self):
+		for annualize in (True, False):
+			batch = compute_tax_batch("New", GROSS, EXEMPT, annualize=annualize)
+			for i, gross in enumerate(GROSS):
+				expected = _reference(gross, 0.0, 60000.0, NEW_SLABS, None, annualize)
+				for key in RESULT_KEYS:
+					self.assertEqual(batch[key][i], expected[key], (gross, key))
+
+	def test_scalar_wrappers_match_batch(self):
+		old = compute_tax_batch(get_slab_table("Old"), GROSS, EXEMPT)
+		new = compute_tax_batch(get_slab_table("New"), GROSS)
+		for i, (gross, exempt) in enumerate(zip(GROSS, EXEMPT)):
+			old_calc = _compute_tax_old_custom(gross, exempt)
+			new_calc = _compute_tax_new_custom(gross)
+			for key in RESULT_KEYS:
+				self.assertEqual(old_calc[key], old[key][i])
+				self.assertEqual(new_calc[key], new[key][i])
+
+	def test_breakdown_sums_to_slab_tax(self):
+		calc = _compute_tax_new_custom(1800000, want_breakdown=True)
+		self.assertEqual(flt(sum(b["tax"] for b in calc["bands"]), 2), calc["slab_tax"])
+
+	def test_compiled_table_matches_band_walk(self):
+		table = compile_regime(OLD_REGIME)
+		for taxable in (0, 1, 250000, 499999.99, 500000, 500000.01, 999999, 1000000, 2750000):
+			walked = sum(b["tax"] for b in slab_breakdown(table, taxable))
+			self.assertAlmostEqual(slab_tax_for(table, taxable), walked, places=1)
+
+	def test_slab_table_cached_per_fiscal_year(self):
+		clear_slab_cache()
+		first = get_slab_table("Old", "2025-06-30")
+		self.assertIs(get_slab_table("Old", "2026-03-31"), first)
+		self.assertIsNot(get_slab_table("Old", "2026-04-01"), first)
+		clear_slab_cache()
+		self.assertIsNot(get_slab_table("Old", "2025-06-30"), first)
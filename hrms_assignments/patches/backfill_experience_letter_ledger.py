@@ -0,0 +1,20 @@
+import frappe
+
+from hrms_assignments.custom_script.employee.employee import (
+    LEDGER_JOB_EXPERIENCE_LETTER,
+)
+from hrms_assignments.utilities.processing_ledger import record_many
+
+
+def execute():
+    """Record already attached experience letters in the Processing Ledger."""
+    employees = frappe.get_all(
+        "File",
+        filters={
+            "attached_to_doctype": "Employee",
+            "file_name": ["like", "Experience_Letter_%"],
+        },
+        pluck="attached_to_name",
+        distinct=True,
+    )
+    record_many(LEDGER_JOB_EXPERIENCE_LETTER, "Employee", employees)
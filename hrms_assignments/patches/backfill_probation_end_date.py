@@ -0,0 +1,31 @@
+import frappe
+from frappe.utils import create_batch
+
+from hrms_assignments.custom_script.employee.employee import compute_probation_end_date
+
+
+def execute():
+    """Fill custom_probation_end_date for employees on probation that lack one."""
+    employees = frappe.get_all(
+        "Employee",
+        filters={
+            "custom_is_under_probation": 1,
+            "custom_probation_end_date": ["is", "not set"],
+        },
+        fields=["name", "date_of_joining", "custom_probation_period"],
+    )
+    for batch in create_batch(employees, 500):
+        for emp in batch:
+            end_date = compute_probation_end_date(
+                joining_date=emp.date_of_joining,
+                probation_period=emp.custom_probation_period,
+            ).get("end_date")
+            if end_date:
+                frappe.db.set_value(
+                    "Employee",
+                    emp.name,
+                    "custom_probation_end_date",
+                    end_date,
+                    update_modified=False,
+                )
+        frappe.db.commit()
@@ -0,0 +1,54 @@
+import frappe
+from frappe.utils import add_days
+
+from hrms_assignments.scheduled.employee import (
+    AUTO_MARKER,
+    COMMENT_MARKER,
+    LEDGER_JOB_COMPLETE_RESIGNATION,
+    LEDGER_JOB_MARK_LEFT,
+    REMINDER_DAYS_BEFORE,
+    RESIGNATION_MARKER,
+    _reminder_job,
+)
+from hrms_assignments.utilities.processing_ledger import record_many
+
+
+def execute():
+    """Seed the Processing Ledger from the Comment / ToDo markers written so far."""
+    separations = frappe.get_all(
+        "Comment",
+        filters={
+            "reference_doctype": "Employee Separation",
+            "content": ["like", f"%{COMMENT_MARKER}%"],
+        },
+        pluck="reference_name",
+    )
+    record_many(LEDGER_JOB_MARK_LEFT, "Employee Separation", separations)
+
+    resignations = frappe.get_all(
+        "Comment",
+        filters={
+            "reference_doctype": "Resignation",
+            "content": ["like", f"%{RESIGNATION_MARKER}%"],
+        },
+        pluck="reference_name",
+    )
+    record_many(LEDGER_JOB_COMPLETE_RESIGNATION, "Employee Resignation", resignations)
+
+    # Reminders are created REMINDER_DAYS_BEFORE days ahead of the probation end,
+    # so the ToDo date gives the end date the reminder was sent for.
+    reminders = {}
+    for todo in frappe.get_all(
+        "ToDo",
+        filters={
+            "reference_type": "Employee",
+            "description": ["like", f"%{AUTO_MARKER}%"],
+        },
+        fields=["allocated_to", "reference_name", "date", "creation"],
+    ):
+        if todo.allocated_to:
+            end_date = add_days(todo.date or todo.creation, REMINDER_DAYS_BEFORE)
+            job = _reminder_job(todo.allocated_to, end_date)
+            reminders.setdefault(job, []).append(todo.reference_name)
+    for job, employees in reminders.items():
+        record_many(job, "Employee", employees)
@@ -1,10 +1,8 @@
 from __future__ import annotations
-import re
 import frappe
 from frappe.utils import (
     nowdate,
     add_days,
-    add_months,
     today,
     getdate,
     formatdate,
@@ -12,139 +10,168 @@ from frappe.utils import (
 )
 
 from hrms_assignments.custom_script.employee.employee import (
-    generate_and_attach_experience_letter,
+    enqueue_experience_letter,
+)
+from hrms_assignments.utilities.processing_ledger import (
+    FAILED,
+    completed_pairs,
+    completed_set,
+    failed_names,
+    record,
+    record_many,
 )
 
 AUTO_MARKER = "[AUTO:PROBATION-REMINDER]"
 REMINDER_DAYS_BEFORE = 15
+REMINDER_CATCH_UP_MAX_DAYS = 30
+PROBATION_REMINDER_WATERMARK = "hrms_assignments_probation_reminder_watermark"
 COMMENT_MARKER = "Auto-marked Employee as Left from Separation completion"
 RESIGNATION_MARKER = (
     "Auto-updated Resignation status to Completed (Separation completed)"
 )
+LEDGER_JOB_MARK_LEFT = "mark_as_left"
+LEDGER_JOB_COMPLETE_RESIGNATION = "complete_resignation"
+LEDGER_JOB_PROBATION_REMINDER = "probation_reminder"
+MARK_AS_LEFT_WATERMARK = "hrms_assignments_mark_as_left_watermark"
+MARK_AS_LEFT_BATCH_SIZE = 500
 
 
 # -----Helpers----------#
 
 
-def _compute_probation_completion_date(doj, probation_period):
-    if not doj:
-        return None
-    try:
-        if probation_period:
-            pp_as_date = getdate(probation_period)
-            if isinstance(probation_period, str) and "-" in probation_period:
-                return str(pp_as_date)
-    except Exception as e:
-        pass
-
-    months = _extract_months(probation_period)
-    if months is not None:
-        try:
-            doj_date = getdate(doj)
-            return str(add_months(doj_date, months))
-        except Exception as e:
-            return None
-
-    return None
-
-
-def _extract_months(value):
-    if value is None:
-        return None
-
-    try:
-        iv = int(value)
-        if iv >= 0:
-            return iv
-    except Exception:
-        pass
-
-    if isinstance(value, str):
-        m = re.search(r"(\d+)", value)
-        if m:
-            try:
-                return int(m.group(1))
-            except Exception:
-                return None
-    return None
-
-
-def _get_manager_user(reports_to_emp):
-    if not reports_to_emp:
-        return None
-    return frappe.db.get_value("Employee", reports_to_emp, "user_id")
-
-
-def _find_linked_resignation(sep_name: str, employee: str) -> str | None:
-    direct = frappe.db.get_value(
-        "Employee Resignation", {"employee_separation": sep_name}, "name"
-    )
-    if direct:
-        return direct
-
-    rows = frappe.get_all(
+def _get_manager_users(reports_to_ids) -> dict:
+    """{employee: user_id} for all reporting managers, in one query."""
+    ids = list({r for r in reports_to_ids if r})
+    if not ids:
+        return {}
+    return {
+        e.name: e.user_id
+        for e in frappe.get_all(
+            "Employee",
+            filters={"name": ["in", ids]},
+            fields=["name", "user_id"],
+        )
+        if e.user_id
+    }
+
+
+def _resignations_to_complete() -> list:
+    """
+    Open resignations that belong to a completed separation: linked to it directly,
+    or, when unlinked, the employee's latest submitted resignation. Driven from the
+    open resignations, so failed updates and resignations linked after their
+    separation was processed are picked up on the next run.
+    """
+    open_resignations = frappe.get_all(
         "Employee Resignation",
-        filters={"employee": employee, "docstatus": 1},
-        fields=["name"],
-        order_by="modified desc",
-        limit=1,
+        filters={"docstatus": ["<", 2], "status": ["!=", "Completed"]},
+        fields=["name", "employee", "employee_separation", "docstatus"],
     )
-    return rows[0]["name"] if rows else None
-
-
-def _maybe_create_todo_for_user(
-    employee_name: str,
-    employee_display: str,
-    allocated_to,
-    role: str,
-    end_date: str,
-):
-    if not allocated_to:
-        return
-
-    exists = frappe.db.exists(
-        "ToDo",
-        {
-            "reference_type": "Employee",
-            "reference_name": employee_name,
-            "allocated_to": allocated_to,
-            "status": "Open",
-            "description": ["like", f"%{AUTO_MARKER}%"],
-        },
-    )
-    if exists:
-        return
-
-    description = (
-        f"{AUTO_MARKER} Probation reminder for <b>{escape_html(employee_display)}</b> "
-        f"(Employee: {escape_html(employee_name)}) — probation ends on "
-        f"<b>{formatdate(end_date)}</b>.<br>"
-        f"Please complete the probation evaluation form."
-    )
-
-    todo = frappe.get_doc(
-        {
-            "doctype": "ToDo",
-            "allocated_to": allocated_to,
-            "status": "Open",
-            "priority": "Medium",
-            "date": nowdate(),
-            "reference_type": "Employee",
-            "reference_name": employee_name,
-            "description": description,
-        }
+    done = _marked_resignations(r.name for r in open_resignations)
+    open_resignations = [r for r in open_resignations if r.name not in done]
+    if not open_resignations:
+        return []
+
+    direct = {r.employee_separation for r in open_resignations if r.employee_separation}
+    unlinked = {
+        r.employee
+        for r in open_resignations
+        if not r.employee_separation and r.docstatus == 1 and r.employee
+    }
+
+    completed_seps, latest = set(), {}
+    if direct:
+        completed_seps = set(
+            frappe.get_all(
+                "Employee Separation",
+                filters={
+                    "name": ["in", list(direct)],
+                    "docstatus": 1,
+                    "boarding_status": "Completed",
+                },
+                pluck="name",
+            )
+        )
+    employees_left = []
+    if unlinked:
+        employees_left = frappe.get_all(
+            "Employee Separation",
+            filters={
+                "employee": ["in", list(unlinked)],
+                "docstatus": 1,
+                "boarding_status": "Completed",
+            },
+            pluck="employee",
+            distinct=True,
+        )
+    if employees_left:
+        for r in frappe.get_all(
+            "Employee Resignation",
+            filters={"employee": ["in", employees_left], "docstatus": 1},
+            fields=["name", "employee"],
+            order_by="modified desc",
+        ):
+            latest.setdefault(r.employee, r.name)
+
+    return [
+        r.name
+        for r in open_resignations
+        if r.employee_separation in completed_seps
+        or (not r.employee_separation and latest.get(r.employee) == r.name)
+    ]
+
+
+def _create_probation_todos(reminders) -> int:
+    """
+    Create the missing probation reminder ToDos for `reminders`
+    ((employee, employee_display, allocated_to, end_date) tuples). The ledger is
+    checked for the whole set in one query and written in one statement per job;
+    ToDos go through insert() so assignments show up on the Employee.
+    """
+    reminders = [r for r in reminders if r[2]]
+    done = completed_pairs(
+        {_reminder_job(r[2], r[3]) for r in reminders},
+        "Employee",
+        {r[0] for r in reminders},
     )
-    todo.insert(ignore_permissions=True)
-
-
-def _maybe_complete_resignation_for_separation(sep_name: str, employee: str) -> None:
-    res_name = _find_linked_resignation(sep_name, employee)
-    if not res_name:
-        return
-
-    if _resignation_already_marked(res_name):
-        return
 
+    created = {}
+    for employee_name, employee_display, allocated_to, end_date in reminders:
+        job = _reminder_job(allocated_to, end_date)
+        if (job, employee_name) in done or employee_name in created.get(job, ()):
+            continue
+        description = (
+            f"{AUTO_MARKER} Probation reminder for "
+            f"<b>{escape_html(employee_display)}</b> "
+            f"(Employee: {escape_html(employee_name)}) — probation ends on "
+            f"<b>{formatdate(end_date)}</b>.<br>"
+            f"Please complete the probation evaluation form."
+        )
+        frappe.get_doc(
+            {
+                "doctype": "ToDo",
+                "allocated_to": allocated_to,
+                "status": "Open",
+                "priority": "Medium",
+                "date": nowdate(),
+                "reference_type": "Employee",
+                "reference_name": employee_name,
+                "description": description,
+            }
+        ).insert(ignore_permissions=True)
+        created.setdefault(job, []).append(employee_name)
+
+    for job, employees in created.items():
+        record_many(job, "Employee", employees)
+    return sum(len(employees) for employees in created.values())
+
+
+def _reminder_job(allocated_to: str, end_date) -> str:
+    # Keyed by end date so an extended probation gets a fresh reminder.
+    return f"{LEDGER_JOB_PROBATION_REMINDER}:{allocated_to}:{getdate(end_date)}"
+
+
+def _complete_resignation(res_name: str) -> None:
     try:
         res = frappe.get_doc("Employee Resignation", res_name)
         current = (res.status or "").strip().lower()
@@ -156,22 +183,18 @@ def _maybe_complete_resignation_for_separation(sep_name: str, employee: str) ->
     except Exception:
         frappe.log_error(
             frappe.get_traceback(),
-            f"_maybe_complete_resignation_for_separation failed: {res_name}",
+            f"_complete_resignation failed: {res_name}",
+        )
+        record(
+            LEDGER_JOB_COMPLETE_RESIGNATION,
+            "Employee Resignation",
+            res_name,
+            state=FAILED,
         )
 
 
-def _already_processed(separation_name: str) -> bool:
-    return bool(
-        frappe.get_all(
-            "Comment",
-            filters={
-                "reference_doctype": "Employee Separation",
-                "reference_name": separation_name,
-                "content": ("like", f"%{COMMENT_MARKER}%"),
-            },
-            limit=1,
-        )
-    )
+def _processed_separations(separation_names) -> set:
+    return completed_set(LEDGER_JOB_MARK_LEFT, "Employee Separation", separation_names)
 
 
 def _drop_resignation_marker_comment(resignation_name: str) -> None:
@@ -184,6 +207,7 @@ def _drop_resignation_marker_comment(resignation_name: str) -> None:
             "content": RESIGNATION_MARKER,
         }
     ).insert(ignore_permissions=True)
+    record(LEDGER_JOB_COMPLETE_RESIGNATION, "Employee Resignation", resignation_name)
 
 
 def _drop_marker_comment(separation_name: str) -> None:
@@ -196,19 +220,12 @@ def _drop_marker_comment(separation_name: str) -> None:
             "content": COMMENT_MARKER,
         }
     ).insert(ignore_permissions=True)
+    record(LEDGER_JOB_MARK_LEFT, "Employee Separation", separation_name)
 
 
-def _resignation_already_marked(resignation_name: str) -> bool:
-    return bool(
-        frappe.get_all(
-            "Comment",
-            filters={
-                "reference_doctype": "Resignation",
-                "reference_name": resignation_name,
-                "content": ("like", f"%{RESIGNATION_MARKER}%"),
-            },
-            limit=1,
-        )
+def _marked_resignations(resignation_names) -> set:
+    return completed_set(
+        LEDGER_JOB_COMPLETE_RESIGNATION, "Employee Resignation", resignation_names
     )
 
 
@@ -221,8 +238,9 @@ def _mark_employee_left_for_separation(sep_row: dict) -> None:
     )
 
     changed = False
+    was_left = getattr(emp, "status", None) == "Left"
 
-    if getattr(emp, "status", None) != "Left":
+    if not was_left:
         emp.status = "Left"
         changed = True
 
@@ -241,95 +259,140 @@ def _mark_employee_left_for_separation(sep_row: dict) -> None:
 
     if changed:
         emp.save(ignore_permissions=True)
-    try:
-        generate_and_attach_experience_letter(
-            employee_name=sep_row["employee"], letter_date=today
-        )
-    except Exception as e:
-        frappe.throw(f"Error while attaching experience letter")
+    if was_left:
+        # The Employee validate hook only queues the letter on the move to Left.
+        enqueue_experience_letter(employee_name=sep_row["employee"], letter_date=today())
 
 
 # -------Main Logic-------#
 
 
 def run_daily_probation_reminders():
-    today = getdate(nowdate())
+    """
+    Create reminders for probations ending REMINDER_DAYS_BEFORE days out. Days missed
+    since the last successful run (kept as a watermark, capped at
+    REMINDER_CATCH_UP_MAX_DAYS) are caught up with the same range query.
+    """
+    run_date = getdate(nowdate())
+    last_run = frappe.db.get_default(PROBATION_REMINDER_WATERMARK)
+    window_start = run_date
+    if last_run:
+        window_start = max(
+            getdate(add_days(last_run, 1)),
+            getdate(add_days(run_date, -REMINDER_CATCH_UP_MAX_DAYS)),
+        )
+    if window_start > run_date:
+        return
+
     employees = frappe.get_all(
         "Employee",
         filters={
             "custom_is_under_probation": 1,
             "status": "Active",
+            "custom_probation_end_date": [
+                "between",
+                [
+                    add_days(window_start, REMINDER_DAYS_BEFORE),
+                    add_days(run_date, REMINDER_DAYS_BEFORE),
+                ],
+            ],
         },
         fields=[
             "name",
             "employee_name",
             "user_id",
             "reports_to",
-            "date_of_joining",
-            "custom_probation_period",
+            "custom_probation_end_date",
         ],
     )
 
+    managers = _get_manager_users(emp.get("reports_to") for emp in employees)
+    reminders = []
     for emp in employees:
-        end_date_of_probation = _compute_probation_completion_date(
-            doj=emp.get("date_of_joining"),
-            probation_period=emp.get("custom_probation_period"),
-        )
+        display = emp.get("employee_name") or emp["name"]
+        employee_user = (emp.get("user_id") or "").strip() or None
+        manager = managers.get(emp.get("reports_to"))
+        end_date = str(emp.get("custom_probation_end_date"))
+        for allocated_to in (employee_user, manager):
+            reminders.append((emp["name"], display, allocated_to, end_date))
 
-        if not end_date_of_probation:
-            continue
+    _create_probation_todos(reminders)
+    frappe.db.set_default(PROBATION_REMINDER_WATERMARK, str(run_date))
 
-        if getdate(add_days(end_date_of_probation, -REMINDER_DAYS_BEFORE)) != today:
-            continue
 
-        employee_user = (emp.get("user_id") or "").strip() or None
-        manager = _get_manager_user(emp.get("reports_to"))
-
-        _maybe_create_todo_for_user(
-            employee_name=emp["name"],
-            employee_display=emp.get("employee_name") or emp["name"],
-            allocated_to=employee_user,
-            role="employee",
-            end_date=str(end_date_of_probation),
+def _get_mark_as_left_cursor():
+    value = frappe.db.get_default(MARK_AS_LEFT_WATERMARK)
+    if not value:
+        return None
+    if value.startswith("["):
+        return tuple(frappe.parse_json(value))
+    # Watermarks written before the cursor included the name.
+    return (value, "")
+
+
+def _completed_separations_after(cursor, limit):
+    """Completed separations ordered by (modified, name), strictly after `cursor`."""
+    sep = frappe.qb.DocType("Employee Separation")
+    query = (
+        frappe.qb.from_(sep)
+        .select(
+            sep.name,
+            sep.employee,
+            sep.boarding_begins_on,
+            sep.resignation_letter_date,
+            sep.modified,
+        )
+        .where(sep.docstatus == 1)
+        .where(sep.boarding_status == "Completed")
+        .orderby(sep.modified)
+        .orderby(sep.name)
+        .limit(limit)
+    )
+    if cursor:
+        modified, name = cursor
+        query = query.where(
+            (sep.modified > modified) | ((sep.modified == modified) & (sep.name > name))
         )
+    return query.run(as_dict=True)
 
-        _maybe_create_todo_for_user(
-            employee_name=emp["name"],
-            employee_display=emp.get("employee_name") or emp["name"],
-            allocated_to=manager,
-            role="reporting manager",
-            end_date=str(end_date_of_probation),
+
+def _separations_to_retry(exclude):
+    names = [
+        n
+        for n in failed_names(
+            LEDGER_JOB_MARK_LEFT, "Employee Separation", limit=MARK_AS_LEFT_BATCH_SIZE
         )
+        if n not in exclude
+    ]
+    if not names:
+        return []
+    return frappe.get_all(
+        "Employee Separation",
+        filters={"name": ["in", names], "docstatus": 1, "boarding_status": "Completed"},
+        fields=["name", "employee", "boarding_begins_on", "resignation_letter_date"],
+    )
 
 
 def mark_as_left():
+    """
+    Mark employees Left for completed separations changed since the last run.
+    A (modified, name) cursor keeps each run to new or edited separations.
+    Failures are recorded as Failed in the Processing Ledger and retried on later
+    runs without holding the cursor back.
+    """
+    cursor = _get_mark_as_left_cursor()
     try:
-        rows = frappe.get_all(
-            "Employee Separation",
-            filters={"docstatus": 1, "boarding_status": "Completed"},
-            fields=[
-                "name",
-                "employee",
-                "boarding_begins_on",
-                "resignation_letter_date",
-            ],
-            limit=500,
-        )
+        batch = _completed_separations_after(cursor, MARK_AS_LEFT_BATCH_SIZE)
+        retries = _separations_to_retry({sep["name"] for sep in batch})
     except Exception:
         frappe.log_error(frappe.get_traceback(), "mark_as_left: query failed")
         return
 
+    rows = [sep for sep in batch + retries if sep.get("employee")]
+    processed = _processed_separations([sep["name"] for sep in rows])
     for sep in rows:
-        emp_name = sep.get("employee")
-        if not emp_name:
-            continue
-
-        if _already_processed(sep["name"]):
-            _maybe_complete_resignation_for_separation(
-                sep_name=sep["name"], employee=emp_name
-            )
+        if sep["name"] in processed:
             continue
-
         try:
             _mark_employee_left_for_separation(sep)
             _drop_marker_comment(sep["name"])
@@ -338,13 +401,17 @@ def mark_as_left():
                 frappe.get_traceback(),
                 f"mark_as_left: failed processing separation {sep['name']}",
             )
+            record(LEDGER_JOB_MARK_LEFT, "Employee Separation", sep["name"], FAILED)
 
-        try:
-            _maybe_complete_resignation_for_separation(
-                sep_name=sep["name"], employee=emp_name
-            )
-        except Exception as e:
-            frappe.log_error(
-                frappe.get_traceback(),
-                f"mark_as_left: failed updating resignation for separation {sep['name']}",
-            )
+    try:
+        for res_name in _resignations_to_complete():
+            _complete_resignation(res_name)
+    except Exception:
+        frappe.log_error(
+            frappe.get_traceback(), "mark_as_left: failed updating resignations"
+        )
+
+    if batch:
+        last = batch[-1]
+        cursor = [str(last["modified"]), last["name"]]
+        frappe.db.set_default(MARK_AS_LEFT_WATERMARK, frappe.as_json(cursor))
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+import frappe
+
+
+class SiteCache:
+    """
+    Per-process cache scoped to the current site.
+    Each namespace carries a version token in Redis; invalidate() rotates it so every
+    worker drops its local entries on the next lookup. With `shared=True` misses fall
+    through to the Redis site cache before calling the generator, and `maxsize` turns
+    the local store into an LRU.
+    """
+
+    def __init__(self, namespace, maxsize=None, shared=False, expires_in_sec=None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.shared = shared
+        self.expires_in_sec = expires_in_sec
+        self._sites = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _version_key(self):
+        return f"hrms_assignments:{self.namespace}:version"
+
+    def version(self):
+        return frappe.cache().get_value(self._version_key())
+
+    def _bucket(self):
+        site = getattr(frappe.local, "site", None)
+        version = self.version()
+        cached = self._sites.get(site)
+        if not cached or cached[0] != version:
+            cached = (version, OrderedDict())
+            self._sites[site] = cached
+        return cached
+
+    def _shared_key(self, version, key):
+        return f"hrms_assignments:{self.namespace}:{version or 0}:{key}"
+
+    def get(self, key, generator):
+        version, bucket = self._bucket()
+        if key in bucket:
+            self.hits += 1
+            bucket.move_to_end(key)
+            return bucket[key]
+
+        value = None
+        if self.shared:
+            value = frappe.cache().get_value(self._shared_key(version, key))
+            if value is not None:
+                self.shared_hits += 1
+
+        if value is None:
+            self.misses += 1
+            value = generator()
+            if self.shared:
+                frappe.cache().set_value(
+                    self._shared_key(version, key),
+                    value,
+                    expires_in_sec=self.expires_in_sec,
+                )
+
+        bucket[key] = value
+        if self.maxsize and len(bucket) > self.maxsize:
+            bucket.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        frappe.cache().set_value(self._version_key(), frappe.generate_hash(length=12))
+        self._sites.pop(getattr(frappe.local, "site", None), None)
+
+    def stats(self):
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+        }
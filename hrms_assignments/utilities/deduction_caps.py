@@ -0,0 +1,169 @@
+"""
+Pure 80C/80D capping kernel shared by the investment declaration, its bulk totals
+endpoint and the ETED sync. Nothing here touches the database.
+
+Row shapes:
+    80C row: (section_code, subcategory, amount)
+    80D row: (insured_for, is_senior, is_preventive, amount)
+80D buckets are (group, senior) with group in {"SelfFamily", "Parents"}; caps are
+{bucket: {"cap": float, "preventive_cap": float}} and must cover all four buckets,
+as investment_rules.get_80d_caps() always does.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+SELF_FAMILY = "SelfFamily"
+PARENTS = "Parents"
+SELF_FAMILY_SET = {"self", "spouse", "children"}
+
+Bucket = Tuple[str, int]
+Caps = Dict[Bucket, Dict[str, float]]
+
+
+def rows_80c(rows: Iterable[Dict], amount_field: str) -> List[Tuple[str, str, float]]:
+    return [
+        (
+            (r.get("section_code") or "").strip(),
+            (r.get("subcategory") or "").strip(),
+            float(r.get(amount_field) or 0),
+        )
+        for r in rows
+    ]
+
+
+def rows_80d(
+    rows: Iterable[Dict], amount_field: str
+) -> List[Tuple[str, int, int, float]]:
+    return [
+        (
+            (r.get("insured_for") or "").strip(),
+            1 if int(r.get("is_a_senior_citizen") or 0) else 0,
+            1 if int(r.get("preventive_health_checkup") or 0) else 0,
+            float(r.get(amount_field) or 0),
+        )
+        for r in rows
+    ]
+
+
+def bucket_of(insured_for: str, is_senior: int) -> Bucket:
+    group = SELF_FAMILY if (insured_for or "").lower() in SELF_FAMILY_SET else PARENTS
+    return (group, 1 if is_senior else 0)
+
+
+def total_80c(rows: Iterable[Tuple[str, str, float]]) -> float:
+    return sum(amount for section, _sub, amount in rows if section == "80C")
+
+
+def cap_80c(rows: Iterable[Tuple[str, str, float]], cap: float) -> float:
+    return min(total_80c(rows), cap)
+
+
+def split_80c(
+    rows: Iterable[Tuple[str, str, float]], cap: float, subcategories: Dict[str, str]
+) -> Dict[str, float]:
+    """
+    Capped 80C amounts per target key. `subcategories` maps a lower-cased row
+    subcategory to a key; rows with unmapped subcategories are ignored. When the
+    sum exceeds `cap`, every key is scaled down pro rata.
+    """
+    out = dict.fromkeys(subcategories.values(), 0.0)
+    for section, sub, amount in rows:
+        key = subcategories.get(sub.lower())
+        if section == "80C" and key:
+            out[key] += amount
+
+    raw = sum(out.values())
+    total = min(raw, cap)
+    if total < raw and total > 0:
+        factor = total / max(raw, 1.0)
+        for key in out:
+            out[key] = round(out[key] * factor, 2)
+    return out
+
+
+def aggregate_80d(
+    rows: Iterable[Tuple[str, int, int, float]],
+) -> Dict[Bucket, List[float]]:
+    """{bucket: [premium, preventive]} for all four buckets."""
+    agg = {
+        (group, senior): [0.0, 0.0]
+        for group in (SELF_FAMILY, PARENTS)
+        for senior in (0, 1)
+    }
+    for insured_for, is_senior, is_preventive, amount in rows:
+        agg[bucket_of(insured_for, is_senior)][1 if is_preventive else 0] += amount
+    return agg
+
+
+def cap_80d_bucket(
+    premium: float, preventive: float, cap: float, preventive_cap: float
+) -> Tuple[float, float]:
+    """
+    Allowed (premium, preventive) for one bucket. Preventive spend counts up to its
+    sub-cap; any excess is treated as premium, and the sum is held to `cap`.
+    """
+    prev_allow = min(max(preventive, 0.0), preventive_cap)
+    normal = max(premium, 0.0) + max(preventive - prev_allow, 0.0)
+    total_allow = min(prev_allow + normal, cap)
+    if total_allow < prev_allow:
+        return 0.0, total_allow
+    return total_allow - prev_allow, prev_allow
+
+
+def cap_80d(
+    rows: Iterable[Tuple[str, int, int, float]], caps: Caps
+) -> Dict[Bucket, Tuple[float, float]]:
+    """Allowed (premium, preventive) per bucket."""
+    out = {}
+    for bucket, (premium, preventive) in aggregate_80d(rows).items():
+        c = caps[bucket]
+        out[bucket] = cap_80d_bucket(
+            premium, preventive, float(c["cap"]), float(c["preventive_cap"])
+        )
+    return out
+
+
+def capped_80d_total(rows: Iterable[Tuple[str, int, int, float]], caps: Caps) -> float:
+    return sum(
+        premium + preventive for premium, preventive in cap_80d(rows, caps).values()
+    )
+
+
+def check_80d_limits(
+    rows: Iterable[Tuple[str, int, int, float]], caps: Caps, tolerance: float = 0.001
+):
+    """
+    Buckets whose raw amounts break a limit, as (bucket, kind, amount, limit) with
+    kind "preventive" or "total".
+    """
+    violations = []
+    for bucket, (premium, preventive) in aggregate_80d(rows).items():
+        c = caps[bucket]
+        preventive_cap = float(c["preventive_cap"])
+        cap = float(c["cap"])
+        if preventive > preventive_cap + tolerance:
+            violations.append((bucket, "preventive", preventive, preventive_cap))
+        if premium + preventive > cap + tolerance:
+            violations.append((bucket, "total", premium + preventive, cap))
+    return violations
+
+
+def compute_totals(
+    inv_rows: Iterable[Dict],
+    med_rows: Iterable[Dict],
+    cap_80c_amount: float,
+    caps: Caps,
+) -> Tuple[float, float, Dict[str, float]]:
+    """Capped (declared, verified, sectionwise) totals for one declaration."""
+    inv_rows = list(inv_rows)
+    med_rows = list(med_rows)
+    sectionwise = {}
+    for kind in ("declared", "verified"):
+        field = f"amount_{kind}"
+        sectionwise[f"80C_{kind}"] = cap_80c(rows_80c(inv_rows, field), cap_80c_amount)
+        sectionwise[f"80D_{kind}"] = capped_80d_total(rows_80d(med_rows, field), caps)
+    return (
+        sectionwise["80C_declared"] + sectionwise["80D_declared"],
+        sectionwise["80C_verified"] + sectionwise["80D_verified"],
+        sectionwise,
+    )
@@ -1,5 +1,21 @@
 import frappe
 from datetime import date
+from frappe.utils import create_batch
+
+from hrms_assignments.utilities.deduction_caps import (
+    PARENTS,
+    SELF_FAMILY,
+    cap_80d,
+    rows_80c,
+    rows_80d,
+    split_80c,
+)
+from hrms_assignments.utilities.exemption_catalogue import validate_exemption
+from hrms_assignments.utilities.investment_rules import get_80c_cap, get_80d_caps
+from hrms_assignments.utilities.payroll_periods import (
+    fiscal_year_dates,
+    get_payroll_period,
+)
 
 CAT_80C = "Section 80C (Umbrella)"
 CAT_80D_SF_NS = "Section 80D - Self/Family (Non-Senior)"
@@ -16,86 +32,107 @@ SC_80D_SF_NS_PREVENTIVE = "80D-SF-NS-Preventive"
 SC_80D_P_SR_PREMIUM = "80D-Parents-SR-Premium"
 SC_80D_P_SR_PREVENTIVE = "80D-Parents-SR-Preventive"
 
+SUBCATEGORY_80C_KEYS = {
+    "ppf": "PPF",
+    "elss": "ELSS",
+    "lic": "LIC",
+    "life insurance": "LIC",
+    "life-insurance": "LIC",
+}
+
 # ----------------- helpers -----------------
 
 
 def _fy_to_dates(fy_str=None):
-    s = (fy_str or "").replace(" ", "")
-    if "-" in s:
-        left, right = s.split("-", 1)
-
-        def norm(y: str, ref=None):
-            y = y.strip()
-            if len(y) == 2:
-                cent = str(ref)[:2] if ref else "20"
-                return int(cent + y)
-            return int(y)
-
-        y1 = norm(left)
-        y2 = norm(right, ref=y1)
-    else:
-        y1 = int(s)
-        y2 = y1 + 1
-
-    return date(y1, 4, 1), date(y2, 3, 31)
+    return fiscal_year_dates(fy_str)
+
+
+def _get_payroll_period_for_dates(start: date, end: date, company=None):
+    return get_payroll_period(start, end, company)
+
+
+def build_sync_context(declarations):
+    """
+    Resolve, in a few set-based queries, everything sync_to_eted_from_custom looks up
+    for a set of declarations (rows with employee and fiscal_year): payroll periods,
+    existing ETEDs and employee/company details.
+    """
+    ctx = frappe._dict(payroll_periods={}, eteds={}, employees={}, currencies={})
+    employees = list({d.employee for d in declarations})
+    for batch in create_batch(employees, 1000):
+        for e in frappe.get_all(
+            "Employee",
+            filters={"name": ["in", batch]},
+            fields=["name", "employee_name", "company"],
+        ):
+            ctx.employees[e.name] = e
 
+    for d in declarations:
+        company = (ctx.employees.get(d.employee) or {}).get("company")
+        if (d.fiscal_year, company) not in ctx.payroll_periods:
+            ctx.payroll_periods[(d.fiscal_year, company)] = (
+                _get_payroll_period_for_dates(*_fy_to_dates(d.fiscal_year), company)
+            )
 
-def _get_payroll_period_for_dates(start: date, end: date):
-    rows = frappe.get_all(
-        "Payroll Period",
-        filters={"start_date": ["<=", start], "end_date": [">=", end]},
-        fields=["name"],
-        order_by="start_date desc",
-        limit=1,
-    )
-    return rows[0]["name"] if rows else None
+    periods = list({pp for pp in ctx.payroll_periods.values() if pp})
+    for batch in create_batch(employees if periods else [], 1000):
+        for t in frappe.get_all(
+            "Employee Tax Exemption Declaration",
+            filters={"employee": ["in", batch], "payroll_period": ["in", periods]},
+            fields=["name", "employee", "payroll_period"],
+        ):
+            ctx.eteds[(t.employee, t.payroll_period)] = t.name
+
+    companies = list({e.company for e in ctx.employees.values() if e.company})
+    if companies:
+        ctx.currencies = dict(
+            frappe.get_all(
+                "Company",
+                filters={"name": ["in", companies]},
+                fields=["name", "default_currency"],
+                as_list=True,
+            )
+        )
+    return ctx
 
 
-def _get_or_create_eted(employee: str, payroll_period: str):
-    name = frappe.db.get_value(
-        "Employee Tax Exemption Declaration",
-        {"employee": employee, "payroll_period": payroll_period},
-        "name",
-    )
+def _get_or_create_eted(employee: str, payroll_period: str, context=None):
+    if context is not None:
+        name = context.eteds.get((employee, payroll_period))
+    else:
+        name = frappe.db.get_value(
+            "Employee Tax Exemption Declaration",
+            {"employee": employee, "payroll_period": payroll_period},
+            "name",
+        )
     if name:
         return frappe.get_doc("Employee Tax Exemption Declaration", name)
 
-    emp = frappe.get_doc("Employee", employee)
+    if context is not None and employee in context.employees:
+        emp = context.employees[employee]
+        currency = context.currencies.get(emp.company)
+    else:
+        emp = frappe.get_doc("Employee", employee)
+        currency = frappe.db.get_value("Company", emp.company, "default_currency")
     eted = frappe.get_doc(
         {
             "doctype": "Employee Tax Exemption Declaration",
             "employee": employee,
             "employee_name": emp.employee_name,
             "company": emp.company,
-            "currency": frappe.db.get_value("Company", emp.company, "default_currency"),
+            "currency": currency,
             "payroll_period": payroll_period,
             "declarations": [],
         }
     )
-    eted.insert(ignore_permissions=True)
     return eted
 
 
-def _reset_declarations(eted):
-    eted.set("declarations", [])
-
-
 def _append_decl(eted, category_name: str, subcategory_name=None, amount=None):
     amt = float(amount or 0)
     if amt <= 0:
         return
-    if not frappe.db.exists(
-        "Employee Tax Exemption Category", {"name": category_name, "is_active": 1}
-    ):
-        frappe.throw(f"Tax Exemption Category '{category_name}' not found or inactive.")
-    if subcategory_name:
-        if not frappe.db.exists(
-            "Employee Tax Exemption Sub Category",
-            {"name": subcategory_name, "is_active": 1},
-        ):
-            frappe.throw(
-                f"Tax Exemption Sub Category '{subcategory_name}' not found or inactive."
-            )
+    validate_exemption(category_name, subcategory_name)
 
     eted.append(
         "declarations",
@@ -107,122 +144,113 @@ def _append_decl(eted, category_name: str, subcategory_name=None, amount=None):
     )
 
 
+def _apply_declarations(eted, desired) -> bool:
+    """
+    Bring eted.declarations in line with `desired` ((category, sub_category, amount)
+    tuples) by updating, removing and appending only the rows that differ.
+    Returns True when anything changed.
+    """
+    wanted = {}
+    for category, sub_category, amount in desired:
+        amount = round(float(amount or 0), 2)
+        if amount > 0:
+            wanted[(category, sub_category or None)] = amount
+
+    changed = False
+    kept = []
+    for row in eted.get("declarations") or []:
+        key = (row.exemption_category, row.exemption_sub_category or None)
+        if key not in wanted:
+            changed = True
+            continue
+        amount = wanted.pop(key)
+        if round(float(row.amount or 0), 2) != amount:
+            row.amount = amount
+            changed = True
+        kept.append(row)
+
+    if changed:
+        eted.set("declarations", kept)
+    for (category, sub_category), amount in wanted.items():
+        _append_decl(eted, category, sub_category, amount)
+        changed = True
+    return changed
+
+
 def _get_80c_verified_from_custom(doc):
-    rows = frappe.get_all(
-        "Employee Investment Line",
-        filters={"parent": doc.name, "parenttype": doc.doctype, "section_code": "80C"},
-        fields=["subcategory", "amount_verified"],
+    inv_rows, _ = doc.child_rows()
+    return split_80c(
+        rows_80c(inv_rows, "amount_verified"), get_80c_cap(), SUBCATEGORY_80C_KEYS
     )
-    out = {"PPF": 0.0, "ELSS": 0.0, "LIC": 0.0}
-    for r in rows:
-        sub = (r.get("subcategory") or "").strip().lower()
-        val = float(r.get("amount_verified") or 0)
-        if sub == "ppf":
-            out["PPF"] += val
-        elif sub == "elss":
-            out["ELSS"] += val
-        elif sub in ("lic", "life insurance", "life-insurance"):
-            out["LIC"] += val
-
-    total = min(sum(out.values()), 150000.0)
-    if total < sum(out.values()) and total > 0:
-        factor = total / max(sum(out.values()), 1.0)
-        for k in out:
-            out[k] = round(out[k] * factor, 2)
-    return out
 
 
 def _get_80d_verified_from_custom(doc):
-    rows = frappe.get_all(
-        "Medical Insurance Line",
-        filters={"parent": doc.name, "parenttype": doc.doctype},
-        fields=[
-            "insured_for",
-            "is_a_senior_citizen",
-            "amount_verified",
-            "preventive_health_checkup",
-        ],
-    )
-
-    agg = {
-        "SF_NS_Premium": 0.0,
-        "SF_NS_Preventive": 0.0,
-        "P_SR_Premium": 0.0,
-        "P_SR_Preventive": 0.0,
+    _, med_rows = doc.child_rows()
+    allowed = cap_80d(rows_80d(med_rows, "amount_verified"), get_80d_caps())
+
+    sf_premium, sf_preventive = allowed[(SELF_FAMILY, 0)]
+    p_premium, p_preventive = allowed[(PARENTS, 1)]
+    return {
+        "SF_NS_Premium": round(sf_premium, 2),
+        "SF_NS_Preventive": round(sf_preventive, 2),
+        "P_SR_Premium": round(p_premium, 2),
+        "P_SR_Preventive": round(p_preventive, 2),
     }
 
-    for r in rows:
-        who = (r.get("insured_for") or "").strip().lower()
-        senior = 1 if int(r.get("is_a_senior_citizen") or 0) else 0
-        amt = float(r.get("amount_verified") or 0)
-        is_prev = 1 if int(r.get("preventive_health_checkup") or 0) else 0
-
-        if who in {"self", "spouse", "children"} and senior == 0:
-            if is_prev:
-                agg["SF_NS_Preventive"] += amt
-            else:
-                agg["SF_NS_Premium"] += amt
-
-        if who == "parents" and senior == 1:
-            if is_prev:
-                agg["P_SR_Preventive"] += amt
-            else:
-                agg["P_SR_Premium"] += amt
-
-    def cap_bucket(prem_key: str, prev_key: str, cap_total: float, cap_prev: float):
-        prev_allow = min(agg[prev_key], cap_prev)
-        overflow_prev = max(agg[prev_key] - prev_allow, 0.0)
-        normal = agg[prem_key] + overflow_prev
-        total_allow = min(prev_allow + normal, cap_total)
-        if total_allow < prev_allow:
-            prev_allow = total_allow
-            normal_allow = 0.0
-        else:
-            normal_allow = total_allow - prev_allow
-        agg[prem_key] = round(normal_allow, 2)
-        agg[prev_key] = round(prev_allow, 2)
-
-    cap_bucket("SF_NS_Premium", "SF_NS_Preventive", 25000.0, 5000.0)
-    cap_bucket("P_SR_Premium", "P_SR_Preventive", 50000.0, 5000.0)
-
-    return agg
-
-
-def sync_to_eted_from_custom(doc):
+
+def sync_to_eted_from_custom(doc, context=None):
+    """
+    Mirror a locked declaration's verified 80C/80D amounts into the employee's ETED.
+    `context` (from build_sync_context) replaces the per-call lookups when many
+    declarations are synced together.
+    """
     fy_start, fy_end = _fy_to_dates(doc.fiscal_year)
-    pp = _get_payroll_period_for_dates(fy_start, fy_end)
-    print("Start", fy_start)
-    print("End", fy_end)
+    if context is not None and doc.employee in context.employees:
+        company = context.employees[doc.employee].company
+        pp = context.payroll_periods.get((doc.fiscal_year, company))
+    else:
+        company = frappe.get_cached_value("Employee", doc.employee, "company")
+        pp = _get_payroll_period_for_dates(fy_start, fy_end, company)
     if not pp:
         frappe.throw(f"No Payroll Period found covering {fy_start} to {fy_end}.")
 
-    eted = _get_or_create_eted(doc.employee, pp)
-
-    _reset_declarations(eted)
+    eted = _get_or_create_eted(doc.employee, pp, context)
 
     c80c = _get_80c_verified_from_custom(doc)
-    _append_decl(eted, CAT_80C, SC_80C_PPF, c80c["PPF"])
-    _append_decl(eted, CAT_80C, SC_80C_ELSS, c80c["ELSS"])
-    _append_decl(eted, CAT_80C, SC_80C_LIC, c80c["LIC"])
-
     d80d = _get_80d_verified_from_custom(doc)
-    _append_decl(eted, CAT_80D_SF_NS, SC_80D_SF_NS_PREMIUM, d80d["SF_NS_Premium"])
-    _append_decl(eted, CAT_80D_SF_NS, SC_80D_SF_NS_PREVENTIVE, d80d["SF_NS_Preventive"])
-    _append_decl(eted, CAT_80D_PARENTS_SR, SC_80D_P_SR_PREMIUM, d80d["P_SR_Premium"])
-    _append_decl(
-        eted, CAT_80D_PARENTS_SR, SC_80D_P_SR_PREVENTIVE, d80d["P_SR_Preventive"]
+    changed = _apply_declarations(
+        eted,
+        (
+            (CAT_80C, SC_80C_PPF, c80c["PPF"]),
+            (CAT_80C, SC_80C_ELSS, c80c["ELSS"]),
+            (CAT_80C, SC_80C_LIC, c80c["LIC"]),
+            (CAT_80D_SF_NS, SC_80D_SF_NS_PREMIUM, d80d["SF_NS_Premium"]),
+            (CAT_80D_SF_NS, SC_80D_SF_NS_PREVENTIVE, d80d["SF_NS_Preventive"]),
+            (CAT_80D_PARENTS_SR, SC_80D_P_SR_PREMIUM, d80d["P_SR_Premium"]),
+            (CAT_80D_PARENTS_SR, SC_80D_P_SR_PREVENTIVE, d80d["P_SR_Preventive"]),
+        ),
     )
 
-    if eted.docstatus == 0:
+    # An unchanged ETED is left alone entirely, including a draft whose earlier
+    # submit failed; it is submitted again on the next sync that changes it.
+    changed = changed or eted.is_new()
+    if changed and eted.docstatus == 0:
         eted.save(ignore_permissions=True)
         try:
             eted.submit()
         except Exception:
             pass
-    else:
+    elif changed:
         try:
             eted.save(ignore_permissions=True)
         except Exception:
             pass
 
-    frappe.msgprint(f"Synced to ETED: {eted.name}", alert=True, indicator="green")
+    if context is None:
+        message = (
+            f"Synced to ETED: {eted.name}"
+            if changed
+            else f"ETED {eted.name} is already up to date"
+        )
+        frappe.msgprint(message, alert=True, indicator="green")
+    return eted
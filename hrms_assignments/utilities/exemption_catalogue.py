@@ -0,0 +1,45 @@
+from typing import FrozenSet, Tuple
+
+import frappe
+
+from hrms_assignments.utilities.cache import SiteCache
+
+_catalogue_cache = SiteCache(
+    "exemption_catalogue", maxsize=1, shared=True, expires_in_sec=24 * 60 * 60
+)
+
+
+def _load_catalogue() -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    categories = frozenset(
+        frappe.get_all(
+            "Employee Tax Exemption Category", filters={"is_active": 1}, pluck="name"
+        )
+    )
+    sub_categories = frozenset(
+        frappe.get_all(
+            "Employee Tax Exemption Sub Category", filters={"is_active": 1}, pluck="name"
+        )
+    )
+    return categories, sub_categories
+
+
+def get_exemption_catalogue() -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """
+    Active (categories, sub_categories) names, loaded once and cached until an
+    exemption category or sub-category changes.
+    """
+    return _catalogue_cache.get("active", _load_catalogue)
+
+
+def validate_exemption(category_name: str, subcategory_name=None):
+    categories, sub_categories = get_exemption_catalogue()
+    if category_name not in categories:
+        frappe.throw(f"Tax Exemption Category '{category_name}' not found or inactive.")
+    if subcategory_name and subcategory_name not in sub_categories:
+        frappe.throw(
+            f"Tax Exemption Sub Category '{subcategory_name}' not found or inactive."
+        )
+
+
+def clear_exemption_catalogue(doc=None, method=None):
+    _catalogue_cache.invalidate()
@@ -0,0 +1,154 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.utils import create_batch, getdate, nowdate
+from frappe.utils.file_manager import save_file
+from frappe.utils.pdf import get_pdf
+
+from hrms_assignments.custom_script.employee.employee import (
+    LEDGER_JOB_EXPERIENCE_LETTER,
+    RESUME_MARKER,
+    render_experience_letter,
+)
+from hrms_assignments.utilities.processing_ledger import completed_set, record
+
+DEFAULT_CONCURRENCY = 4
+ATTACH_BATCH_SIZE = 50
+
+
+@frappe.whitelist()
+def bulk_generate_experience_letters(employees, concurrency=None) -> str:
+    """Queue experience letters for many employees; returns the background job id."""
+    frappe.only_for(("HR Manager", "System Manager"))
+    if isinstance(employees, str):
+        employees = frappe.parse_json(employees)
+    if not employees:
+        frappe.throw("Select at least one Employee.")
+
+    job_id = f"bulk_experience_letters:{frappe.generate_hash(length=10)}"
+    frappe.enqueue(
+        "hrms_assignments.utilities.experience_letters.generate_experience_letters",
+        queue=frappe.conf.get("experience_letter_queue") or "long",
+        timeout=6 * 60 * 60,
+        job_id=job_id,
+        employees=list(employees),
+        concurrency=concurrency,
+        user=frappe.session.user,
+    )
+    return job_id
+
+
+def generate_experience_letters(
+    employees, letter_date=None, concurrency=None, user=None
+):
+    """
+    Generate and attach experience letters for `employees` in one pass.
+    HTML is rendered with the same get_print pipeline as single letters, PDFs are
+    produced by at most `concurrency` parallel wkhtmltopdf runs, and files are
+    attached in batches.
+    Returns counts and throughput (letters per minute).
+    """
+    started = time.monotonic()
+    letter_date = getdate(letter_date or nowdate())
+    concurrency = max(
+        1,
+        int(
+            concurrency
+            or frappe.conf.get("experience_letter_concurrency")
+            or DEFAULT_CONCURRENCY
+        ),
+    )
+
+    employees = list(dict.fromkeys(e for e in employees if e))
+    done = _already_generated(employees)
+    pending = [e for e in employees if e not in done]
+
+    letters, failed = [], []
+    for name in pending:
+        try:
+            emp = frappe.get_doc("Employee", name)
+            if not emp.get("relieving_date"):
+                emp.relieving_date = letter_date
+            letters.append((name, render_experience_letter(emp)))
+        except Exception:
+            failed.append(name)
+            frappe.log_error(
+                frappe.get_traceback(), f"Experience Letter render failed for {name}"
+            )
+
+    site = frappe.local.site
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pdfs = list(pool.map(lambda letter: _pdf_in_site(site, letter[1]), letters))
+
+    generated = 0
+    results = list(zip((name for name, _html in letters), pdfs))
+    for batch in create_batch(results, ATTACH_BATCH_SIZE):
+        for name, (pdf, error) in batch:
+            if error:
+                failed.append(name)
+                frappe.log_error(error, f"Experience Letter PDF failed for {name}")
+                continue
+            _attach_letter(name, pdf)
+            generated += 1
+        frappe.db.commit()
+
+    seconds = time.monotonic() - started
+    summary = {
+        "requested": len(employees),
+        "generated": generated,
+        "skipped": len(employees) - len(pending),
+        "failed": len(failed),
+        "failed_employees": failed,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 2),
+        "letters_per_minute": round(generated * 60 / seconds, 1) if seconds else 0.0,
+    }
+    frappe.logger("hrms_assignments").info(
+        f"Experience letters: {generated} generated in {summary['seconds']}s "
+        f"({summary['letters_per_minute']}/min, concurrency {concurrency})"
+    )
+    if user:
+        frappe.publish_realtime("bulk_experience_letters_done", summary, user=user)
+    return summary
+
+
+def _pdf_in_site(site, html):
+    """
+    Run get_pdf in a worker thread. get_pdf reads Print Settings, so each thread
+    needs its own site context; errors are returned for the caller to log, since
+    nothing is committed from here. A failed connect is reported the same way, so
+    one worker cannot abort the batch.
+    """
+    try:
+        frappe.init(site=site)
+        frappe.connect()
+        return get_pdf(html), None
+    except Exception:
+        return None, traceback.format_exc()
+    finally:
+        frappe.destroy()
+
+
+def _already_generated(employees):
+    generated = set()
+    for batch in create_batch(employees, 1000):
+        generated |= completed_set(LEDGER_JOB_EXPERIENCE_LETTER, "Employee", batch)
+    return generated
+
+
+def _attach_letter(employee, pdf):
+    save_file(
+        f"Experience_Letter_{employee}.pdf", pdf, "Employee", employee, is_private=1
+    )
+    record(LEDGER_JOB_EXPERIENCE_LETTER, "Employee", employee)
+    frappe.get_doc(
+        {
+            "doctype": "Comment",
+            "comment_type": "Comment",
+            "reference_doctype": "Employee",
+            "reference_name": employee,
+            "content": RESUME_MARKER,
+        }
+    ).insert(ignore_permissions=True)
@@ -0,0 +1,105 @@
+from typing import Dict, List, Tuple
+
+import frappe
+
+from hrms_assignments.utilities.cache import SiteCache
+
+CAP_80C_DEFAULT = 150000.0
+PREVENTIVE_CAP_DEFAULT = 5000.0
+SELF_FAMILY_SET = {"Self", "Spouse", "Children"}
+DEFAULT_80D_CAPS = {
+    ("SelfFamily", 0): 25000.0,
+    ("SelfFamily", 1): 50000.0,
+    ("Parents", 0): 25000.0,
+    ("Parents", 1): 50000.0,
+}
+
+_rule_cache = SiteCache(
+    "investment_rule_caps", maxsize=16, shared=True, expires_in_sec=24 * 60 * 60
+)
+
+
+def _load_section_rule(section: str) -> Dict:
+    row = frappe.get_all(
+        "Investment Section Rule",
+        filters={"section": section, "is_active": 1},
+        fields=["name", "section", "computation_type", "absolute_cap"],
+        order_by="modified desc",
+        limit=1,
+    )
+    return row[0] if row else {}
+
+
+def _load_80d_variants(parent_rule_name: str) -> List[Dict]:
+    if not parent_rule_name:
+        return []
+    return frappe.get_all(
+        "Investment Rule Variant",
+        filters={"parent": parent_rule_name},
+        fields=[
+            "beneficiary_group",
+            "senior_only",
+            "absolute_cap",
+            "preventive_health_checkup_cap",
+        ],
+        order_by="idx asc, modified desc",
+    )
+
+
+def _build_80c_cap() -> float:
+    rule = _load_section_rule("80C")
+    cap = float(rule.get("absolute_cap") or 0)
+    return cap if cap > 0 else CAP_80C_DEFAULT
+
+
+def _build_80d_caps() -> Dict[Tuple[str, int], Dict[str, float]]:
+    rule = _load_section_rule("80D")
+    variants = _load_80d_variants(rule.get("name"))
+    caps: Dict[Tuple[str, int], Dict[str, float]] = {}
+
+    def map_bucket(beneficiary_group: str) -> str:
+        g = (beneficiary_group or "").strip()
+        if g in SELF_FAMILY_SET:
+            return "SelfFamily"
+        if g == "Parents":
+            return "Parents"
+        return "SelfFamily"
+
+    for v in variants:
+        key = (
+            map_bucket(v.get("beneficiary_group") or ""),
+            int(v.get("senior_only") or 0),
+        )
+        cap = float(v.get("absolute_cap") or 0)
+        prev_raw = v.get("preventive_health_checkup_cap")
+        prev_cap = float(prev_raw or PREVENTIVE_CAP_DEFAULT)
+        if key not in caps or cap > caps[key]["cap"]:
+            caps[key] = {"cap": cap, "preventive_cap": max(prev_cap, 0.0)}
+
+    # Buckets without a configured variant keep the statutory caps the declaration
+    # validation has always enforced.
+    for key, cap in DEFAULT_80D_CAPS.items():
+        caps.setdefault(key, {"cap": cap, "preventive_cap": PREVENTIVE_CAP_DEFAULT})
+    return caps
+
+
+def get_80c_cap() -> float:
+    return _rule_cache.get("80C", _build_80c_cap)
+
+
+def get_80d_caps() -> Dict[Tuple[str, int], Dict[str, float]]:
+    """
+    Cap map keyed by (bucket, senior_flag) → {cap, preventive_cap}
+    bucket ∈ {"SelfFamily","Parents"}; senior_flag ∈ {0,1}
+    """
+    return _rule_cache.get("80D", _build_80d_caps)
+
+
+def clear_rule_cache(doc=None, method=None):
+    _rule_cache.invalidate()
+
+
+@frappe.whitelist()
+def get_rule_cache_stats():
+    frappe.only_for("System Manager")
+    return _rule_cache.stats()
@@ -0,0 +1,22 @@
+import frappe
+
+from hrms_assignments.utilities.cache import SiteCache
+
+_fieldnames = SiteCache("meta_fieldnames")
+
+
+def get_fieldnames(doctype):
+    """Set of fieldnames on `doctype`, built once per process until its schema changes."""
+    return _fieldnames.get(doctype, lambda: _load_fieldnames(doctype))
+
+
+def _load_fieldnames(doctype):
+    try:
+        meta = frappe.get_meta(doctype)
+    except Exception:
+        return frozenset()
+    return frozenset(df.fieldname for df in meta.fields)
+
+
+def clear_fieldname_index(doc=None, method=None):
+    _fieldnames.invalidate()
@@ -0,0 +1,67 @@
+from bisect import bisect_right
+from datetime import date
+from functools import lru_cache
+
+import frappe
+from frappe.utils import getdate
+
+from hrms_assignments.utilities.cache import SiteCache
+
+_period_index = SiteCache("payroll_period_index", maxsize=64)
+
+
+@lru_cache(maxsize=256)
+def fiscal_year_dates(fy_str=None):
+    """(1 April, 31 March) for a fiscal year like "2025-26", "2025-2026" or "2025"."""
+    s = (fy_str or "").replace(" ", "")
+    if "-" in s:
+        left, right = s.split("-", 1)
+
+        def norm(y: str, ref=None):
+            y = y.strip()
+            if len(y) == 2:
+                cent = str(ref)[:2] if ref else "20"
+                return int(cent + y)
+            return int(y)
+
+        y1 = norm(left)
+        y2 = norm(right, ref=y1)
+    else:
+        y1 = int(s)
+        y2 = y1 + 1
+
+    return date(y1, 4, 1), date(y2, 3, 31)
+
+
+def _build_index(company=None):
+    filters = {"company": company} if company else {}
+    rows = frappe.get_all(
+        "Payroll Period",
+        filters=filters,
+        fields=["name", "start_date", "end_date"],
+        order_by="start_date asc, name asc",
+    )
+    return {
+        "starts": [getdate(r.start_date) for r in rows],
+        "ends": [getdate(r.end_date) for r in rows],
+        "names": [r.name for r in rows],
+    }
+
+
+def get_payroll_period(start, end, company=None):
+    """
+    Latest-starting Payroll Period of `company` (any company when omitted) that
+    covers start..end. Periods are indexed once per company as sorted start/end
+    arrays; a lookup is a bisect plus a short backwards scan.
+    """
+    index = _period_index.get(company, lambda: _build_index(company))
+    start, end = getdate(start), getdate(end)
+    ends = index["ends"]
+    for i in range(bisect_right(index["starts"], start) - 1, -1, -1):
+        if ends[i] >= end:
+            return index["names"][i]
+    return None
+
+
+def clear_payroll_period_index(doc=None, method=None):
+    _period_index.invalidate()
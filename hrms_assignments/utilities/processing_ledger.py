@@ -0,0 +1,123 @@
+from typing import Iterable, Set, Tuple
+
+import frappe
+from frappe.utils import now_datetime
+
+LEDGER_DOCTYPE = "Processing Ledger"
+COMPLETED = "Completed"
+FAILED = "Failed"
+
+
+def completed_set(
+    job: str, reference_doctype: str, reference_names: Iterable[str]
+) -> Set[str]:
+    """Names among `reference_names` that `job` has already completed."""
+    names = list({n for n in reference_names if n})
+    if not names:
+        return set()
+    return set(
+        frappe.get_all(
+            LEDGER_DOCTYPE,
+            filters={
+                "job": job,
+                "reference_doctype": reference_doctype,
+                "reference_name": ["in", names],
+                "state": COMPLETED,
+            },
+            pluck="reference_name",
+        )
+    )
+
+
+def completed_pairs(
+    jobs: Iterable[str], reference_doctype: str, reference_names: Iterable[str]
+) -> Set[Tuple[str, str]]:
+    """(job, reference name) pairs already completed, for several jobs at once."""
+    jobs = list({j for j in jobs if j})
+    names = list({n for n in reference_names if n})
+    if not jobs or not names:
+        return set()
+    return {
+        (r.job, r.reference_name)
+        for r in frappe.get_all(
+            LEDGER_DOCTYPE,
+            filters={
+                "job": ["in", jobs],
+                "reference_doctype": reference_doctype,
+                "reference_name": ["in", names],
+                "state": COMPLETED,
+            },
+            fields=["job", "reference_name"],
+        )
+    }
+
+
+def failed_names(job: str, reference_doctype: str, limit=None):
+    """Reference names whose last attempt at `job` failed, oldest failure first."""
+    return frappe.get_all(
+        LEDGER_DOCTYPE,
+        filters={"job": job, "reference_doctype": reference_doctype, "state": FAILED},
+        pluck="reference_name",
+        order_by="modified asc",
+        limit=limit,
+    )
+
+
+def is_completed(job: str, reference_doctype: str, reference_name: str) -> bool:
+    return bool(completed_set(job, reference_doctype, [reference_name]))
+
+
+def record(job: str, reference_doctype: str, reference_name: str, state=COMPLETED):
+    record_many(job, reference_doctype, [reference_name], state)
+
+
+def record_many(job: str, reference_doctype: str, reference_names, state=COMPLETED):
+    """
+    Set the ledger state for `reference_names`: existing rows are moved to `state`
+    and missing ones are bulk-inserted.
+    """
+    names = list(dict.fromkeys(n for n in reference_names if n))
+    if not names:
+        return
+    now = now_datetime()
+    user = frappe.session.user
+    ledger = frappe.qb.DocType(LEDGER_DOCTYPE)
+    (
+        frappe.qb.update(ledger)
+        .set(ledger.state, state)
+        .set(ledger.modified, now)
+        .set(ledger.modified_by, user)
+        .where(ledger.job == job)
+        .where(ledger.reference_doctype == reference_doctype)
+        .where(ledger.reference_name.isin(names))
+        .where(ledger.state != state)
+    ).run()
+    frappe.db.bulk_insert(
+        LEDGER_DOCTYPE,
+        fields=[
+            "name",
+            "creation",
+            "modified",
+            "owner",
+            "modified_by",
+            "job",
+            "state",
+            "reference_doctype",
+            "reference_name",
+        ],
+        values=[
+            (
+                frappe.generate_hash(length=10),
+                now,
+                now,
+                user,
+                user,
+                job,
+                state,
+                reference_doctype,
+                name,
+            )
+            for name in names
+        ],
+        ignore_duplicates=True,
+    )
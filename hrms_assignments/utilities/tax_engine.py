@@ -0,0 +1,209 @@
+from bisect import bisect_left
+
+from frappe.utils import flt
+
+# Regime definitions. A band is (from, to, rate_pct, min_taxable_income): the band is
+# only levied once taxable income exceeds min_taxable_income (None = always levied).
+OLD_REGIME = {
+    "name": "Old",
+    "std_deduction": 50000.0,
+    "allow_exemptions": True,
+    "bands": [
+        (0.0, 250000.0, 0.0, None),
+        (250000.0, 500000.0, 5.0, 500000.0),
+        (500000.0, 1000000.0, 20.0, None),
+        (1000000.0, None, 30.0, None),
+    ],
+    "rebate_limit": 500000.0,
+    "cess_pct": 4.0,
+}
+
+NEW_REGIME = {
+    "name": "New",
+    "std_deduction": 60000.0,
+    "allow_exemptions": False,
+    "bands": [
+        (0.0, 400000.0, 0.0, None),
+        (400000.0, 800000.0, 5.0, None),
+        (800000.0, 1200000.0, 10.0, None),
+        (1200000.0, 1600000.0, 15.0, None),
+        (1600000.0, 2000000.0, 20.0, None),
+        (2000000.0, 2400000.0, 25.0, None),
+        (2400000.0, None, 30.0, None),
+    ],
+    "rebate_limit": None,
+    "cess_pct": 4.0,
+}
+
+REGIMES = {"Old": OLD_REGIME, "New": NEW_REGIME}
+
+RESULT_KEYS = (
+    "gross_annual",
+    "std_deduction",
+    "exemptions_total",
+    "taxable_income",
+    "slab_tax",
+    "rebate_applied",
+    "cess_amount",
+    "net_tax",
+    "monthly_tds",
+    "effective_rate_pct",
+)
+
+
+_COMPILED_FIXTURES = {}
+
+
+def get_regime(regime):
+    """Return a compiled slab table for a regime name, definition or compiled table."""
+    if isinstance(regime, dict):
+        return regime if "breakpoints" in regime else compile_regime(regime)
+    if regime not in _COMPILED_FIXTURES:
+        try:
+            _COMPILED_FIXTURES[regime] = compile_regime(REGIMES[regime])
+        except KeyError:
+            raise ValueError(f"Unknown tax regime: {regime}")
+    return _COMPILED_FIXTURES[regime]
+
+
+def compile_regime(definition):
+    """
+    Precompile a regime definition into cumulative-tax breakpoints.
+    Every band edge and band condition becomes a breakpoint; on the interval
+    (breakpoints[i], breakpoints[i + 1]] tax is bases[i] + (x - breakpoints[i]) * rates[i].
+    """
+    bands = [
+        (flt(lo), None if hi is None else flt(hi), flt(rate), min_income)
+        for lo, hi, rate, min_income in definition["bands"]
+    ]
+    points = {0.0}
+    for lo, hi, _rate, min_income in bands:
+        points.add(lo)
+        if hi is not None:
+            points.add(hi)
+        if min_income is not None:
+            points.add(flt(min_income))
+    breakpoints = sorted(points)
+
+    bases, rates = [], []
+    for point in breakpoints:
+        base = rate = 0.0
+        for lo, hi, rate_pct, min_income in bands:
+            if min_income is not None and point < flt(min_income):
+                continue
+            upper = hi if hi is not None else float("inf")
+            base += max(0.0, min(point, upper) - lo) * (rate_pct / 100.0)
+            if lo <= point < upper:
+                rate += rate_pct / 100.0
+        bases.append(base)
+        rates.append(rate)
+
+    table = dict(definition)
+    table.update(
+        {
+            "bands": bands,
+            "breakpoints": breakpoints,
+            "bases": bases,
+            "rates": rates,
+        }
+    )
+    return table
+
+
+def slab_tax_for(table, taxable_income):
+    """Slab tax before rebate and cess: one binary search plus one multiply."""
+    if taxable_income <= 0:
+        return 0.0
+    points = table["breakpoints"]
+    i = bisect_left(points, taxable_income) - 1
+    return table["bases"][i] + (taxable_income - points[i]) * table["rates"][i]
+
+
+def _band_slices(bands, taxable_income):
+    for from_amt, to_amt, rate_pct, min_income in bands:
+        if min_income is not None and taxable_income <= min_income:
+            continue
+        if taxable_income <= from_amt:
+            continue
+        upper = to_amt if to_amt is not None else float("inf")
+        slice_amt = min(taxable_income, upper) - from_amt
+        if slice_amt <= 0:
+            continue
+        yield from_amt, to_amt, rate_pct, slice_amt
+
+
+def compute_tax_batch(regime, gross_incomes, exemptions=None, annualize=True):
+    """
+    Compute tax for many employees in one pass.
+    `regime` is a regime name ("Old"/"New"), a definition or a compiled slab table.
+    Takes parallel sequences of gross annual incomes and Chapter VI-A exemptions and
+    returns a dict of equally long lists keyed by RESULT_KEYS.
+    """
+    reg = get_regime(regime)
+    std_deduction = flt(reg["std_deduction"])
+    rebate_limit = reg.get("rebate_limit")
+    cess_rate = flt(reg["cess_pct"]) / 100.0
+    months = 12 if annualize else 1
+
+    gross_incomes = list(gross_incomes)
+    if exemptions is None or not reg["allow_exemptions"]:
+        exemptions = [0.0] * len(gross_incomes)
+    else:
+        exemptions = list(exemptions)
+        if len(exemptions) != len(gross_incomes):
+            raise ValueError("gross_incomes and exemptions must have the same length")
+
+    out = {key: [] for key in RESULT_KEYS}
+    for gross, exempt in zip(gross_incomes, exemptions):
+        gross = flt(gross)
+        exempt = flt(exempt)
+        taxable_income = max(0.0, gross - std_deduction - exempt)
+
+        slab_tax = slab_tax_for(reg, taxable_income)
+
+        rebate_applied = 0.0
+        if rebate_limit is not None and taxable_income <= rebate_limit:
+            rebate_applied = flt(slab_tax, 2)
+            slab_tax = 0.0
+
+        cess_amount = flt(slab_tax * cess_rate, 2) if slab_tax > 0 else 0.0
+        net_tax = flt(slab_tax + cess_amount, 2)
+
+        out["gross_annual"].append(flt(gross, 2))
+        out["std_deduction"].append(flt(std_deduction, 2))
+        out["exemptions_total"].append(flt(exempt, 2))
+        out["taxable_income"].append(flt(taxable_income, 2))
+        out["slab_tax"].append(flt(slab_tax, 2))
+        out["rebate_applied"].append(flt(rebate_applied, 2))
+        out["cess_amount"].append(flt(cess_amount, 2))
+        out["net_tax"].append(flt(net_tax, 2))
+        out["monthly_tds"].append(flt(net_tax / months, 2))
+        out["effective_rate_pct"].append(
+            flt((net_tax / gross * 100.0), 2) if gross > 0 else 0.0
+        )
+    return out
+
+
+def compute_tax(regime, gross_annual, exemptions=0.0, annualize=True):
+    """Single-employee convenience wrapper over compute_tax_batch."""
+    batch = compute_tax_batch(regime, [gross_annual], [exemptions], annualize)
+    return {key: values[0] for key, values in batch.items()}
+
+
+def slab_breakdown(regime, taxable_income):
+    reg = get_regime(regime)
+    bands = []
+    for from_amt, to_amt, rate_pct, slice_amt in _band_slices(
+        reg["bands"], flt(taxable_income)
+    ):
+        bands.append(
+            {
+                "from": flt(from_amt, 2),
+                "to": (None if to_amt is None else flt(to_amt, 2)),
+                "slice": flt(slice_amt, 2),
+                "rate_pct": flt(rate_pct, 2),
+                "fixed": 0.0,
+                "tax": flt(slice_amt * (rate_pct / 100.0), 2),
+            }
+        )
+    return bands
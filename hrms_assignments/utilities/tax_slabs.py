@@ -0,0 +1,131 @@
+import re
+from datetime import date
+
+import frappe
+from frappe.utils import flt, getdate, nowdate
+
+from hrms_assignments.utilities.cache import SiteCache
+from hrms_assignments.utilities.tax_engine import REGIMES, compile_regime
+
+_slab_tables = SiteCache("tax_slab_tables")
+
+_CONDITION_RE = re.compile(r"^\s*annual_taxable_earning\s*>\s*([0-9]+(?:\.[0-9]+)?)\s*$")
+
+
+def fiscal_year_of(as_on=None):
+    d = getdate(as_on or nowdate())
+    start = d.year if d.month >= 4 else d.year - 1
+    return f"{start}-{str(start + 1)[2:]}"
+
+
+def _fiscal_year_end(fiscal_year):
+    return date(int(fiscal_year.split("-", 1)[0]) + 1, 3, 31)
+
+
+def get_slab_table(regime, as_on=None, company=None):
+    """
+    Compiled slab table for a regime ("Old"/"New") effective in the fiscal year of
+    `as_on`, for `company` when given. Loaded once per (regime, fiscal year, company)
+    and cached until an Income Tax Slab changes.
+    """
+    fiscal_year = fiscal_year_of(as_on)
+    return _slab_tables.get(
+        (regime, fiscal_year, company or ""),
+        lambda: _build_slab_table(regime, fiscal_year, company),
+    )
+
+
+def _build_slab_table(regime, fiscal_year, company=None):
+    definition = _load_regime_from_income_tax_slab(regime, fiscal_year, company)
+    if not definition:
+        definition = dict(REGIMES[regime], source="fixture")
+    return compile_regime(definition)
+
+
+def _find_income_tax_slab(regime, fiscal_year, company=None):
+    """
+    Latest submitted, enabled Income Tax Slab named for `regime` as a whole word
+    ("Old Regime", "FY25 New Tax Regime"; not "Gold Plan") for the company.
+    """
+    filters = {
+        "docstatus": 1,
+        "disabled": 0,
+        "effective_from": ["<=", _fiscal_year_end(fiscal_year)],
+        "name": ["like", f"%{regime}%"],
+    }
+    if company:
+        filters["company"] = company
+    pattern = re.compile(rf"\b{re.escape(regime)}\b", re.IGNORECASE)
+    for name in frappe.get_all(
+        "Income Tax Slab",
+        filters=filters,
+        pluck="name",
+        order_by="effective_from desc",
+    ):
+        if pattern.search(name):
+            return name
+    return None
+
+
+def _load_regime_from_income_tax_slab(regime, fiscal_year, company=None):
+    slab_name = _find_income_tax_slab(regime, fiscal_year, company)
+    if not slab_name:
+        return None
+
+    slab = frappe.get_doc("Income Tax Slab", slab_name)
+    bands = []
+    for row in slab.get("slabs") or []:
+        min_income = None
+        condition = (row.get("condition") or "").strip()
+        if condition:
+            m = _CONDITION_RE.match(condition)
+            if not m:
+                frappe.log_error(
+                    f"Unsupported slab condition '{condition}' in {slab.name}",
+                    "Tax slab table: falling back to built-in regime",
+                )
+                return None
+            min_income = flt(m.group(1))
+        to_amount = flt(row.get("to_amount"))
+        bands.append(
+            (
+                flt(row.get("from_amount")),
+                to_amount if to_amount > 0 else None,
+                flt(row.get("percent_deduction")),
+                min_income,
+            )
+        )
+    if not bands:
+        return None
+
+    rebate_limit = flt(slab.get("tax_relief_limit"))
+    return {
+        "name": regime,
+        "source": slab.name,
+        "std_deduction": flt(slab.get("standard_tax_exemption_amount")),
+        "allow_exemptions": bool(slab.get("allow_tax_exemption")),
+        "bands": sorted(bands, key=lambda b: b[0]),
+        "rebate_limit": rebate_limit if rebate_limit > 0 else None,
+        "cess_pct": _flat_cess_pct(slab),
+    }
+
+
+def _flat_cess_pct(slab):
+    """
+    Cess levied on every taxpayer. Rows bounded by min/max taxable income are
+    surcharges, which the engine does not model, so they are left out rather than
+    applied as a flat rate to everyone.
+    """
+    return sum(
+        flt(c.get("percent"))
+        for c in slab.get("other_taxes_and_charges") or []
+        if not flt(c.get("min_taxable_income")) and not flt(c.get("max_taxable_income"))
+    )
+
+
+def slab_tables_version():
+    return _slab_tables.version()
+
+
+def clear_slab_cache(doc=None, method=None):
+    _slab_tables.invalidate()
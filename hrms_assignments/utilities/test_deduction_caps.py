@@ -0,0 +1,58 @@
+# Copyright (c) 2025, Sparsh Verma and Contributors
+# See license.txt
+
+import unittest
+
+from hrms_assignments.utilities.deduction_caps import (
+	cap_80d,
+	cap_80d_bucket,
+	check_80d_limits,
+	compute_totals,
+	split_80c,
+)
+from hrms_assignments.utilities.investment_rules import (
+	DEFAULT_80D_CAPS,
+	PREVENTIVE_CAP_DEFAULT,
+)
+
+CAPS = {
+	bucket: {"cap": cap, "preventive_cap": PREVENTIVE_CAP_DEFAULT}
+	for bucket, cap in DEFAULT_80D_CAPS.items()
+}
+
+
+class TestDeductionCaps(unittest.TestCase):
+	def test_preventive_overflow_counts_as_premium(self):
+		self.assertEqual(cap_80d_bucket(10000.0, 8000.0, 25000.0, 5000.0), (13000.0, 5000.0))
+		self.assertEqual(cap_80d_bucket(30000.0, 8000.0, 25000.0, 5000.0), (20000.0, 5000.0))
+		self.assertEqual(cap_80d_bucket(0.0, 8000.0, 3000.0, 5000.0), (0.0, 3000.0))
+
+	def test_senior_self_family_gets_senior_cap(self):
+		allowed = cap_80d([("Self", 1, 0, 60000.0)], CAPS)
+		self.assertEqual(allowed[("SelfFamily", 1)], (50000.0, 0.0))
+		allowed = cap_80d([("Self", 0, 0, 60000.0)], CAPS)
+		self.assertEqual(allowed[("SelfFamily", 0)], (25000.0, 0.0))
+
+	def test_split_80c_scales_pro_rata(self):
+		rows = [("80C", "PPF", 100000.0), ("80C", "ELSS", 100000.0), ("80D", "PPF", 1.0)]
+		out = split_80c(rows, 150000.0, {"ppf": "PPF", "elss": "ELSS"})
+		self.assertEqual(out, {"PPF": 75000.0, "ELSS": 75000.0})
+
+	def test_compute_totals_and_limits_agree(self):
+		inv = [{"section_code": "80C", "amount_declared": 200000, "amount_verified": 120000}]
+		med = [
+			{"insured_for": "Parents", "is_a_senior_citizen": 1, "preventive_health_checkup": 0,
+			 "amount_declared": 60000, "amount_verified": 45000},
+			{"insured_for": "Spouse", "is_a_senior_citizen": 0, "preventive_health_checkup": 1,
+			 "amount_declared": 6000, "amount_verified": 4000},
+		]
+		declared, verified, sectionwise = compute_totals(inv, med, 150000.0, CAPS)
+		self.assertEqual(sectionwise["80C_declared"], 150000.0)
+		self.assertEqual(sectionwise["80D_declared"], 56000.0)
+		self.assertEqual(verified, 120000.0 + 49000.0)
+		self.assertEqual(declared, 206000.0)
+		self.assertEqual(check_80d_limits([("Parents", 1, 0, 45000.0)], CAPS), [])
+		self.assertEqual(
+			check_80d_limits([("Parents", 1, 0, 60000.0)], CAPS),
+			[(("Parents", 1), "total", 60000.0, 50000.0)],
+		)
@@ -0,0 +1,67 @@
+# Copyright (c) 2025, Sparsh Verma and Contributors
+# See license.txt
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from hrms_assignments.utilities.employee import _apply_declarations
+
+
+class FakeETED:
+	def __init__(self, rows):
+		self.declarations = [frappe._dict(row) for row in rows]
+
+	def get(self, fieldname):
+		return getattr(self, fieldname)
+
+	def set(self, fieldname, value):
+		setattr(self, fieldname, list(value))
+
+	def append(self, fieldname, row):
+		getattr(self, fieldname).append(frappe._dict(row))
+
+	def rows(self):
+		return [(r.exemption_category, r.exemption_sub_category, r.amount) for r in self.declarations]
+
+
+def eted_with(*rows):
+	return FakeETED(
+		[
+			{"exemption_category": category, "exemption_sub_category": sub, "amount": amount}
+			for category, sub, amount in rows
+		]
+	)
+
+
+@patch("hrms_assignments.utilities.employee.validate_exemption", lambda *args: None)
+class TestApplyDeclarations(unittest.TestCase):
+	def test_identical_rows_are_a_no_op(self):
+		eted = eted_with(("80C", "PPF", 1000.0), ("80D", "Premium", 500.0))
+		before = list(eted.declarations)
+		changed = _apply_declarations(eted, [("80C", "PPF", 1000.0), ("80D", "Premium", 500.004)])
+		self.assertFalse(changed)
+		self.assertEqual(eted.declarations, before)
+
+	def test_changed_amount_updates_row_in_place(self):
+		eted = eted_with(("80C", "PPF", 1000.0))
+		row = eted.declarations[0]
+		self.assertTrue(_apply_declarations(eted, [("80C", "PPF", 1500.0)]))
+		self.assertIs(eted.declarations[0], row)
+		self.assertEqual(eted.rows(), [("80C", "PPF", 1500.0)])
+
+	def test_rows_missing_or_zero_are_removed(self):
+		eted = eted_with(("80C", "PPF", 1000.0), ("80C", "ELSS", 200.0), ("80D", "Premium", 500.0))
+		self.assertTrue(_apply_declarations(eted, [("80C", "PPF", 1000.0), ("80C", "ELSS", 0)]))
+		self.assertEqual(eted.rows(), [("80C", "PPF", 1000.0)])
+
+	def test_new_rows_are_appended(self):
+		eted = eted_with(("80C", "PPF", 1000.0))
+		self.assertTrue(_apply_declarations(eted, [("80C", "PPF", 1000.0), ("80C", "LIC", 300.0)]))
+		self.assertEqual(eted.rows(), [("80C", "PPF", 1000.0), ("80C", "LIC", 300.0)])
+
+	def test_duplicate_existing_rows_collapse_to_one(self):
+		eted = eted_with(("80C", "PPF", 1000.0), ("80C", "PPF", 1000.0))
+		self.assertTrue(_apply_declarations(eted, [("80C", "PPF", 1000.0)]))
+		self.assertEqual(eted.rows(), [("80C", "PPF", 1000.0)])
@@ -0,0 +1,87 @@
+# Copyright (c) 2025, Sparsh Verma and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from hrms_assignments.custom_script.employee import employee as single
+from hrms_assignments.utilities import experience_letters as bulk
+
+LETTER_DATE = "2025-03-31"
+
+
+class TestExperienceLetters(FrappeTestCase):
+	def setUp(self):
+		if not frappe.db.exists("Print Format", "Experience Letter"):
+			self.skipTest("Experience Letter print format is not installed")
+		rows = frappe.get_all("Employee", pluck="name", limit=1)
+		if not rows:
+			self.skipTest("No Employee to render")
+		self.employee = rows[0]
+
+	def _single_html(self):
+		captured = []
+
+		def fake_get_pdf(html, *args, **kwargs):
+			captured.append(html)
+			return b"%PDF"
+
+		with (
+			patch.object(single, "_already_attached", return_value=False),
+			patch.object(single, "get_pdf", side_effect=fake_get_pdf),
+			patch.object(single, "save_file"),
+			patch.object(single, "record"),
+		):
+			single.generate_and_attach_experience_letter(self.employee, LETTER_DATE)
+		return captured
+
+	def _bulk_html(self):
+		captured = []
+
+		def fake_pdf_in_site(site, html):
+			captured.append(html)
+			return b"%PDF", None
+
+		with (
+			patch.object(bulk, "_already_generated", return_value=set()),
+			patch.object(bulk, "_pdf_in_site", side_effect=fake_pdf_in_site),
+			patch.object(bulk, "_attach_letter"),
+			patch.object(frappe.db, "commit"),
+		):
+			bulk.generate_experience_letters([self.employee], letter_date=LETTER_DATE)
+		return captured
+
+	def test_bulk_html_matches_single_letter(self):
+		single_html = self._single_html()
+		bulk_html = self._bulk_html()
+		self.assertEqual(len(single_html), 1)
+		self.assertEqual(bulk_html, single_html)
+
+	def test_pdf_failure_is_logged_by_caller(self):
+		with (
+			patch.object(bulk, "_already_generated", return_value=set()),
+			patch.object(bulk, "_pdf_in_site", return_value=(None, "Traceback: boom")),
+			patch.object(bulk, "_attach_letter") as attach,
+			patch.object(bulk.frappe, "log_error") as log_error,
+			patch.object(frappe.db, "commit"),
+		):
+			summary = bulk.generate_experience_letters([self.employee], letter_date=LETTER_DATE)
+		attach.assert_not_called()
+		self.assertEqual(summary["failed_employees"], [self.employee])
+		log_error.assert_called_once_with(
+			"Traceback: boom", f"Experience Letter PDF failed for {self.employee}"
+		)
+
+
+class TestPdfWorker(FrappeTestCase):
+	def test_connect_failure_is_returned_not_raised(self):
+		with (
+			patch.object(bulk.frappe, "init"),
+			patch.object(bulk.frappe, "connect", side_effect=Exception("too many connections")),
+			patch.object(bulk.frappe, "destroy"),
+		):
+			pdf, error = bulk._pdf_in_site(frappe.local.site, "<p></p>")
+		self.assertIsNone(pdf)
+		self.assertIn("too many connections", error)